@@ -0,0 +1,27 @@
+"""
+One-time conversion of the example bank CSVs to Parquet.
+
+Run after editing grammar_bank.csv / vocab_bank.csv:
+
+    python convert_banks.py
+
+The app loads the Parquet files when present (columnar binary read, no
+CSV tokenization) and falls back to the CSVs otherwise. The unused
+"GSE Score" column is dropped at write time so the loader never has to.
+"""
+import pandas as pd
+
+BANKS = ("grammar_bank", "vocab_bank")
+
+
+def convert(name):
+    df = pd.read_csv(f"{name}.csv")
+    if "GSE Score" in df.columns:
+        df = df.drop(columns=["GSE Score"])
+    df.to_parquet(f"{name}.parquet", engine="pyarrow", index=False)
+    print(f"{name}.csv -> {name}.parquet ({len(df)} rows)")
+
+
+if __name__ == "__main__":
+    for bank in BANKS:
+        convert(bank)
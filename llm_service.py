@@ -1,6 +1,109 @@
-from openai import OpenAI
+import asyncio
+import json
+import time
 
-def call_llm(messages, api_key, model="gpt-4-turbo-preview", max_tokens=4096):
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+
+# orjson speeds up the batch JSONL round-trip (serialize on submit,
+# parse on retrieve); fall back silently when it is not installed.
+try:
+    import orjson
+
+    def _dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj, separators=(",", ":"))
+
+    _loads = json.loads
+
+# Bound on simultaneous in-flight LLM calls so parallel stages stay inside
+# provider rate limits.
+LLM_MAX_CONCURRENCY = 4
+
+# Provider tier budget the parallel fan-out throttles itself to. Kept a
+# little under the real limits so bursts from other sessions don't tip
+# requests into 429 territory.
+LLM_RPM = 450
+LLM_TPM = 180_000
+
+# Retries per call on a transient provider failure (429, connection
+# drop, 5xx), with exponential backoff between attempts.
+LLM_RATE_LIMIT_RETRIES = 3
+
+_RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+# Default model. gpt-4o-mini decodes several times faster and cheaper than
+# the gpt-4 tier, and every call here already constrains the output with a
+# strict json_schema, so the smaller model cannot return a malformed shape.
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+# One sync client per API key, reused across calls so the underlying
+# HTTP connection pool keeps TCP/TLS sessions alive instead of paying a
+# fresh handshake per request. (Async clients are created per gather in
+# call_llm_parallel: they are bound to the event loop that made them,
+# and asyncio.run builds a new loop each time.)
+_clients = {}
+
+
+class _RateBucket:
+    """
+    Dual request/token bucket for the async fan-out: capacity refills
+    continuously at limit/60 per second (computed lazily on acquire, no
+    background task needed) and each call waits until both a request
+    slot and its estimated token budget are available. Keeps a large
+    gather at the provider ceiling instead of bursting into 429 storms.
+    """
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM):
+        self._rpm = rpm
+        self._tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._last_refill = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._requests = min(self._rpm, self._requests + self._rpm * elapsed / 60.0)
+        self._tokens = min(self._tpm, self._tokens + self._tpm * elapsed / 60.0)
+
+    async def acquire(self, estimated_tokens):
+        while True:
+            self._refill()
+            if self._requests >= 1 and self._tokens >= estimated_tokens:
+                self._requests -= 1
+                self._tokens -= estimated_tokens
+                return
+            await asyncio.sleep(0.05)
+
+
+def _estimate_call_tokens(messages, max_tokens, n=1):
+    """Input estimate at the usual ~4 chars/token plus the completion cap
+    (which applies per sampled completion)."""
+    return (len(messages[0]) + len(messages[1])) // 4 + max_tokens * n
+
+
+def _client(api_key):
+    client = _clients.get(api_key)
+    if client is None:
+        client = _clients[api_key] = OpenAI(api_key=api_key)
+    return client
+
+
+def _response_format(response_schema):
+    """Builds the response_format payload: strict schema when one is given,
+    otherwise plain JSON mode."""
+    if response_schema is None:
+        return {"type": "json_object"}
+    return {"type": "json_schema", "json_schema": {**response_schema, "strict": True}}
+
+
+def call_llm(messages, api_key, model=DEFAULT_MODEL, max_tokens=4096, response_schema=None):
     """
     Sends a message history to the OpenAI API using the provided API key.
     Increased max_tokens to 4096 to support batch generation of multiple questions.
@@ -10,19 +113,241 @@ def call_llm(messages, api_key, model="gpt-4-turbo-preview", max_tokens=4096):
         return "Error: API Key is missing. Please enter it in the sidebar."
 
     try:
-        client = OpenAI(api_key=api_key)
-        
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": messages[0]},
-                {"role": "user", "content": messages[1]}
-            ],
-            temperature=0.9,
-            max_tokens=max_tokens,
-            response_format={"type": "json_object"}
-        )
+        client = _client(api_key)
+
+        for attempt in range(LLM_RATE_LIMIT_RETRIES):
+            try:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": messages[0]},
+                        {"role": "user", "content": messages[1]}
+                    ],
+                    temperature=0.9,
+                    max_tokens=max_tokens,
+                    response_format=_response_format(response_schema)
+                )
+                break
+            except _RETRYABLE_ERRORS:
+                if attempt == LLM_RATE_LIMIT_RETRIES - 1:
+                    raise
+                time.sleep(2 ** attempt)
         return response.choices[0].message.content
-        
+
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def call_llm_stream(messages, api_key, model=DEFAULT_MODEL, max_tokens=4096, response_schema=None, on_delta=None):
+    """
+    Streaming variant of call_llm: consumes the response as server-sent
+    chunks and invokes on_delta(text_chunk) per chunk so callers can show
+    progress while a long batched response is still generating. Returns the
+    full response text, same as call_llm.
+    """
+    if not api_key:
+        return "Error: API Key is missing. Please enter it in the sidebar."
+
+    try:
+        client = _client(api_key)
+
+        for attempt in range(LLM_RATE_LIMIT_RETRIES):
+            try:
+                return _consume_stream(client, messages, model, max_tokens, response_schema, on_delta)
+            except _RETRYABLE_ERRORS:
+                if attempt == LLM_RATE_LIMIT_RETRIES - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def _consume_stream(client, messages, model, max_tokens, response_schema, on_delta):
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": messages[0]},
+            {"role": "user", "content": messages[1]}
+        ],
+        temperature=0.9,
+        max_tokens=max_tokens,
+        response_format=_response_format(response_schema),
+        stream=True
+    )
+
+    chunks = []
+    for event in stream:
+        delta = event.choices[0].delta.content if event.choices else None
+        if delta:
+            chunks.append(delta)
+            if on_delta is not None:
+                on_delta(delta)
+    return "".join(chunks)
+
+
+async def call_llm_async(messages, api_key, model=DEFAULT_MODEL, max_tokens=4096, semaphore=None, response_schema=None, client=None, rate_bucket=None, n=1):
+    """
+    Async variant of call_llm for issuing independent calls concurrently.
+    An optional semaphore bounds in-flight requests across a gather; an
+    optional shared client lets a gather reuse one connection pool, and an
+    optional shared rate bucket keeps the gather under RPM/TPM limits.
+    Transient provider failures are retried with exponential backoff.
+    With n > 1 the call samples n completions of the same prompt and
+    returns them as a list; errors still come back as a single string.
+    """
+    if not api_key:
+        return "Error: API Key is missing. Please enter it in the sidebar."
+
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+    try:
+        async with semaphore:
+            if client is None:
+                client = AsyncOpenAI(api_key=api_key)
+
+            for attempt in range(LLM_RATE_LIMIT_RETRIES):
+                if rate_bucket is not None:
+                    await rate_bucket.acquire(_estimate_call_tokens(messages, max_tokens, n))
+                try:
+                    response = await client.chat.completions.create(
+                        model=model,
+                        messages=[
+                            {"role": "system", "content": messages[0]},
+                            {"role": "user", "content": messages[1]}
+                        ],
+                        temperature=0.9,
+                        max_tokens=max_tokens,
+                        n=n,
+                        response_format=_response_format(response_schema)
+                    )
+                    break
+                except _RETRYABLE_ERRORS:
+                    if attempt == LLM_RATE_LIMIT_RETRIES - 1:
+                        raise
+                    await asyncio.sleep(2 ** attempt)
+        if n == 1:
+            return response.choices[0].message.content
+        return [choice.message.content for choice in response.choices]
+
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def call_llm_parallel(message_pairs, api_key, model=DEFAULT_MODEL, max_tokens=4096, response_schemas=None, on_progress=None, n_choices=None):
+    """
+    Issues several independent LLM calls concurrently and returns their raw
+    responses in input order. Wall time becomes max() of the calls instead
+    of their sum. An optional on_progress(done, total) callback fires as
+    each call completes (in completion order) so callers can show live
+    progress while the gather is still running. n_choices, when given,
+    maps each call to a completion count: calls with n > 1 return a list
+    of sampled completions instead of a single string.
+    """
+    if response_schemas is None:
+        response_schemas = [None] * len(message_pairs)
+    if n_choices is None:
+        n_choices = [1] * len(message_pairs)
+
+    async def _run():
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        client = AsyncOpenAI(api_key=api_key)
+        rate_bucket = _RateBucket()
+        tasks = [
+            asyncio.ensure_future(
+                call_llm_async(messages, api_key, model, max_tokens, semaphore, schema, client, rate_bucket, n)
+            )
+            for messages, schema, n in zip(message_pairs, response_schemas, n_choices)
+        ]
+        if on_progress is not None:
+            done = 0
+            for future in asyncio.as_completed(list(tasks)):
+                await future
+                done += 1
+                on_progress(done, len(tasks))
+        return await asyncio.gather(*tasks)
+
+    return asyncio.run(_run())
+
+
+def batch_submit(message_pairs, api_key, model=DEFAULT_MODEL, max_tokens=4096, response_schemas=None, custom_ids=None):
+    """
+    Submits independent calls through the OpenAI Batch API: roughly half
+    the per-token cost and a separate rate-limit pool, in exchange for an
+    up-to-24h completion window. Returns the batch id, or an "Error: ..."
+    string on failure.
+    """
+    if not api_key:
+        return "Error: API Key is missing. Please enter it in the sidebar."
+
+    if response_schemas is None:
+        response_schemas = [None] * len(message_pairs)
+    if custom_ids is None:
+        custom_ids = [str(i) for i in range(len(message_pairs))]
+
+    try:
+        client = _client(api_key)
+
+        lines = [
+            _dumps({
+                "custom_id": str(custom_id),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": [
+                        {"role": "system", "content": messages[0]},
+                        {"role": "user", "content": messages[1]}
+                    ],
+                    "temperature": 0.9,
+                    "max_tokens": max_tokens,
+                    "response_format": _response_format(schema)
+                }
+            })
+            for custom_id, messages, schema in zip(custom_ids, message_pairs, response_schemas)
+        ]
+        upload = client.files.create(
+            file=("batch_input.jsonl", "\n".join(lines).encode()),
+            purpose="batch"
+        )
+        batch = client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+
     except Exception as e:
         return f"Error: {str(e)}"
+
+
+def batch_retrieve(batch_id, api_key):
+    """
+    Polls a submitted batch once. Returns (status, results): results maps
+    custom_id to the response text when the batch has completed, and is
+    None while it is still in flight or on error.
+    """
+    if not api_key:
+        return "Error: API Key is missing. Please enter it in the sidebar.", None
+
+    try:
+        client = _client(api_key)
+        batch = client.batches.retrieve(batch_id)
+        if batch.status != "completed":
+            return batch.status, None
+
+        content = client.files.content(batch.output_file_id).text
+        results = {}
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            entry = _loads(line)
+            body = (entry.get("response") or {}).get("body") or {}
+            choices = body.get("choices") or []
+            text = choices[0]["message"]["content"] if choices else ""
+            results[entry.get("custom_id")] = text
+        return batch.status, results
+
+    except Exception as e:
+        return f"Error: {str(e)}", None
@@ -1,6 +1,55 @@
 import json
 import re
 
+# orjson parses the nested response dicts a few times faster than the
+# stdlib decoder; fall back silently when it is not installed.
+try:
+    import orjson
+
+    def _loads(text):
+        return orjson.loads(text)
+except ImportError:
+    _loads = json.loads
+
+# Markdown fence stripper, compiled once rather than per response.
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+class JSONArrayProgress:
+    """
+    Incremental counter of completed objects inside a streamed JSON response
+    like {"questions": [{...}, {...}, ...]}. Feed it text deltas as they
+    arrive; it tracks string/escape/depth state across calls so the total
+    work is O(response length) regardless of chunk count.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, delta):
+        """Consumes a text delta and returns the running object count."""
+        for ch in delta:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                self._depth += 1
+            elif ch == '}':
+                self._depth -= 1
+                # An item object of the wrapper dict closes at depth 1.
+                if self._depth == 1:
+                    self.count += 1
+        return self.count
+
 def parse_response(raw_response):
     """
     Takes the raw string from the LLM and converts it into a Python dictionary.
@@ -16,15 +65,14 @@ def parse_response(raw_response):
         clean_text = raw_response.strip()
         
         if "```" in clean_text:
-            pattern = r"```(?:json)?\s*(.*?)```"
-            match = re.search(pattern, clean_text, re.DOTALL)
+            match = _JSON_FENCE_RE.search(clean_text)
             if match:
                 clean_text = match.group(1).strip()
         
-        data = json.loads(clean_text)
+        data = _loads(clean_text)
         return data, None
         
-    except json.JSONDecodeError:
+    except ValueError:
         print(f"FAILED JSON: {raw_response}") 
         return None, "Failed to parse JSON. The AI response was malformed."
     except Exception as e:
@@ -50,7 +98,7 @@ def extract_array_from_response(data):
     # Wrapped in a dict with a single key
     if isinstance(data, dict):
         # Try common wrapper keys (including new architecture keys: candidates, validated)
-        for key in ['questions', 'candidates', 'validated', 'results', 'items', 'data', 'output', 'batch', 'responses']:
+        for key in ['questions', 'candidates', 'validated', 'options', 'results', 'items', 'data', 'output', 'batch', 'responses']:
             if key in data and isinstance(data[key], list):
                 return data[key], None
 
@@ -1,47 +1,342 @@
+import functools
 import json
+import os
 import random
+import sys
+import numpy as np
 import pandas as pd
 import re
 
+# Shared RNG for distractor selection and example sampling. A per-run seed
+# (overridable via EPT3_SEED) makes reruns reproducible: identical inputs
+# produce byte-identical prompts, which also keeps response-cache keys
+# stable across runs.
+RANDOM_SEED = int(os.environ.get("EPT3_SEED", "1234"))
+_rng = random.Random(RANDOM_SEED)
+
+# cefr/type/focus take only a handful of distinct values but repeat across
+# every job in a batch; interning them collapses the duplicates to shared
+# objects and makes the repeated dict hashing cheap.
+_intern = sys.intern
+
+# orjson is a Rust-backed encoder that is several times faster than stdlib
+# json on the nested dict lists we serialize into prompts. Fall back to the
+# stdlib so the app still runs if it isn't installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps(obj):
+    """Compact JSON serialization (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def _dumps_indent(obj):
+    """2-space-indented JSON serialization (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(obj, indent=2)
+
+
+# Indentation adds ~30-50% payload bytes that count against input tokens,
+# and the model parses compact JSON equally well. Flip to False only when
+# eyeballing prompts during debugging.
+PROMPT_JSON_COMPACT = True
+
+
+def _dumps_payload(obj):
+    """JSON serialization for blobs embedded in prompts."""
+    if PROMPT_JSON_COMPACT:
+        return _dumps(obj)
+    return _dumps_indent(obj)
+
+
+# --------------------------------------------------------------------------
+# Response schemas for the sequential three-stage pipeline
+# --------------------------------------------------------------------------
+# Passed to the LLM API as response_format json_schema so the provider
+# validates the shape server-side. This replaces the multi-hundred-line
+# "MANDATORY OUTPUT FORMAT" skeletons that used to be spelled out inside
+# each prompt, cutting instruction tokens and removing malformed-JSON
+# retries.
+
+_STAGE1_ITEM_PROPERTIES = {
+    "Item Number": {"type": "string"},
+    "Assessment Focus": {"type": "string"},
+    "Complete Sentence": {"type": "string"},
+    "Correct Answer": {"type": "string"},
+    "Context Clue Location": {"type": "string"},
+    "Context Clue Explanation": {"type": "string"},
+    "CEFR rating": {"type": "string"},
+    "Category": {"type": "string"},
+}
+
+_STAGE2_ITEM_PROPERTIES = {
+    "Item Number": {"type": "string"},
+    "Candidate A": {"type": "string"},
+    "Candidate B": {"type": "string"},
+    "Candidate C": {"type": "string"},
+    "Candidate D": {"type": "string"},
+    "Candidate E": {"type": "string"},
+}
+
+_STAGE3_ITEM_PROPERTIES = {
+    "Item Number": {"type": "string"},
+    "Selected Distractor A": {"type": "string"},
+    "Selected Distractor B": {"type": "string"},
+    "Selected Distractor C": {"type": "string"},
+    "Validation Notes": {"type": "string"},
+}
+
+_STAGE23_ITEM_PROPERTIES = {
+    "Item Number": {"type": "string"},
+    "Candidate A": {"type": "string"},
+    "Candidate B": {"type": "string"},
+    "Candidate C": {"type": "string"},
+    "Candidate D": {"type": "string"},
+    "Candidate E": {"type": "string"},
+    "Selected Distractor A": {"type": "string"},
+    "Selected Distractor B": {"type": "string"},
+    "Selected Distractor C": {"type": "string"},
+    "Validation Notes": {"type": "string"},
+}
+
+
+def _array_of(item_properties, n):
+    return {
+        "type": "array",
+        "minItems": n,
+        "maxItems": n,
+        "items": {
+            "type": "object",
+            "properties": item_properties,
+            "required": list(item_properties),
+            "additionalProperties": False,
+        },
+    }
+
+
+def _array_response_schema(wrapper_key, item_properties, n):
+    return {
+        "name": f"{wrapper_key}_response",
+        "schema": {
+            "type": "object",
+            "properties": {wrapper_key: _array_of(item_properties, n)},
+            "required": [wrapper_key],
+            "additionalProperties": False,
+        },
+    }
+
+
+def stage1_response_schema(n):
+    """Schema for stage 1: {"questions": [n question objects]}."""
+    return _array_response_schema("questions", _STAGE1_ITEM_PROPERTIES, n)
+
+
+def stage2_response_schema(n):
+    """Schema for stage 2: {"candidates": [n candidate sets]}."""
+    return _array_response_schema("candidates", _STAGE2_ITEM_PROPERTIES, n)
+
+
+def stage3_response_schema(n):
+    """Schema for stage 3: {"validated": [n validated sets]}."""
+    return _array_response_schema("validated", _STAGE3_ITEM_PROPERTIES, n)
+
+
+def stage23_response_schema(n):
+    """Schema for the fused stage 2+3: {"validated": [n entries]}, each
+    carrying both the candidate pool and the final selections."""
+    return _array_response_schema("validated", _STAGE23_ITEM_PROPERTIES, n)
+
+
+# The vocabulary-list pipeline and the batched segmented strategy use the
+# same mechanism with their own item shapes.
+
+_VOCAB_S1_ITEM_PROPERTIES = {
+    "Item Number": {"type": "string"},
+    "Target Vocabulary": {"type": "string"},
+    "Complete Sentence": {"type": "string"},
+    "Correct Answer": {"type": "string"},
+    "Context Clue Location": {"type": "string"},
+    "Context Clue Explanation": {"type": "string"},
+    "CEFR rating": {"type": "string"},
+    "Category": {"type": "string"},
+}
+
+_VOCAB_S2_ITEM_PROPERTIES = {
+    "Item Number": {"type": "string"},
+    "Candidate A": {"type": "string"},
+    "Candidate B": {"type": "string"},
+    "Candidate C": {"type": "string"},
+    "Candidate D": {"type": "string"},
+    "Candidate E": {"type": "string"},
+    "Candidate F": {"type": "string"},
+    "Candidate G": {"type": "string"},
+    "Candidate H": {"type": "string"},
+    "Source Notes": {"type": "string"},
+}
+
+_VOCAB_S3_ITEM_PROPERTIES = {
+    "id": {"type": "string"},
+    "picks": {
+        "type": "array",
+        "minItems": 3,
+        "maxItems": 3,
+        "items": {"type": "string"},
+    },
+    "notes": {"type": "string"},
+}
+
+_OPTIONS_ITEM_PROPERTIES = {
+    "Item Number": {"type": "string"},
+    "Answer A": {"type": "string"},
+    "Answer B": {"type": "string"},
+    "Answer C": {"type": "string"},
+    "Answer D": {"type": "string"},
+    "Correct Answer": {"type": "string"},
+}
+
+_STEM_ITEM_PROPERTIES = {
+    "Item Number": {"type": "string"},
+    "Assessment Focus": {"type": "string"},
+    "Question Prompt": {"type": "string"},
+    "Answer A": {"type": "string"},
+    "Answer B": {"type": "string"},
+    "Answer C": {"type": "string"},
+    "Answer D": {"type": "string"},
+    "Correct Answer": {"type": "string"},
+    "CEFR rating": {"type": "string"},
+    "Category": {"type": "string"},
+}
+
+
+def vocab_stage1_response_schema(n):
+    """Schema for vocab-list stage 1: {"questions": [n question objects]}."""
+    return _array_response_schema("questions", _VOCAB_S1_ITEM_PROPERTIES, n)
+
+
+def vocab_stage2_response_schema(n):
+    """Schema for vocab-list stage 2: {"candidates": [n candidate sets]}."""
+    return _array_response_schema("candidates", _VOCAB_S2_ITEM_PROPERTIES, n)
+
+
+def vocab_stage3_response_schema(n):
+    """Schema for vocab-list stage 3: {"validated": [n id/picks/notes sets]}."""
+    return _array_response_schema("validated", _VOCAB_S3_ITEM_PROPERTIES, n)
+
+
+def options_batch_response_schema(n):
+    """Schema for the segmented options call: {"options": [n option sets]}."""
+    return _array_response_schema("options", _OPTIONS_ITEM_PROPERTIES, n)
+
+
+def stem_batch_response_schema(n):
+    """Schema for the segmented stem call: {"questions": [n question objects]}."""
+    return _array_response_schema("questions", _STEM_ITEM_PROPERTIES, n)
+
 
 # --------------------------------------------------------------------------
 # Helper: Get Examples
 # --------------------------------------------------------------------------
+
+# Columns each rendered example exposes, in output order.
+_EXAMPLE_COLUMNS = (
+    "Question Prompt", "Answer A", "Answer B", "Answer C", "Answer D", "Correct Answer"
+)
+
+
+def build_example_index(example_banks):
+    """
+    One-time preprocessing of the example banks: strips column names once
+    and flattens each bank into plain per-(type, CEFR) lists of example
+    dicts, so sampling and rendering never touch pandas at all.
+
+    Returns {"pools": ..., "all": ..., "has_cefr": ...}.
+    """
+    pools = {}
+    all_rows = {}
+    has_cefr = {}
+    for bank_type, bank in example_banks.items():
+        if bank is None or bank.empty:
+            continue
+        # Map stripped names back to the raw headers instead of copying the
+        # frame and reassigning its columns (which rebuilds the pandas index).
+        raw_name = {str(c).strip(): c for c in bank.columns}
+        columns = {
+            name: bank[raw_name[name]].tolist() if name in raw_name else None
+            for name in _EXAMPLE_COLUMNS
+        }
+        rows = [
+            {
+                name: (values[i] if values is not None else "N/A")
+                for name, values in columns.items()
+            }
+            for i in range(len(bank))
+        ]
+        all_rows[bank_type] = rows
+        has_cefr[bank_type] = 'CEFR rating' in raw_name
+        if not has_cefr[bank_type]:
+            continue
+        cefr_norm = bank[raw_name['CEFR rating']].astype(str).str.strip().tolist()
+        for row, level in zip(rows, cefr_norm):
+            pools.setdefault((bank_type, level), []).append(row)
+    return {"pools": pools, "all": all_rows, "has_cefr": has_cefr}
+
+
+# Cached index per example_banks object (the banks are loaded once per run).
+_example_index_cache = {}
+
+
+def _get_example_index(example_banks):
+    cache_key = id(example_banks)
+    cached = _example_index_cache.get(cache_key)
+    if cached is None:
+        cached = build_example_index(example_banks)
+        _example_index_cache[cache_key] = cached
+    return cached
+
+
 def get_few_shot_examples(job, example_banks):
     """
     Retrieves 2-3 examples from the CSV based on CEFR and Type.
     Robustly handles column name mismatches (e.g., extra spaces).
+
+    The rendered block is memoized per (type, cefr): the per-job legacy
+    strategies would otherwise re-sample and re-serialize rows for every
+    job, and a byte-stable style-reference string also keeps the prompt
+    prefix cache-friendly. Sample variety is therefore per-process, not
+    per-call.
     """
-    bank = example_banks.get(job['type'].lower())
-    if bank is None or bank.empty: 
+    _get_example_index(example_banks)
+    return _cached_examples(job['type'].lower(), str(job['cefr']).strip(), id(example_banks))
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_examples(bank_type, cefr, banks_id):
+    prepared = _example_index_cache[banks_id]
+    rows = prepared["all"].get(bank_type)
+    if rows is None:
         return ""
-    
-    bank.columns = [c.strip() for c in bank.columns]
-    
-    if 'CEFR rating' in bank.columns:
-        relevant = bank[bank['CEFR rating'].astype(str).str.strip() == str(job['cefr']).strip()]
-    else:
-        relevant = bank
 
-    if len(relevant) >= 2:
-        samples = relevant.sample(2)
-    elif len(bank) >= 2:
-        samples = bank.sample(2) 
+    pool = prepared["pools"].get((bank_type, cefr))
+    if pool is None and not prepared["has_cefr"][bank_type]:
+        pool = rows
+
+    # Seeded per key (and per run seed) so repeated calls within a run pick
+    # the same rows, keeping the rendered block lru_cache-safe.
+    rng = random.Random(hash((RANDOM_SEED, bank_type, cefr)))
+    if pool is not None and len(pool) >= 2:
+        picks = rng.sample(pool, 2)
+    elif len(rows) >= 2:
+        picks = rng.sample(rows, 2)
     else:
-        return "" 
-
-    output = ""
-    for _, row in samples.iterrows():
-        ex_dict = {
-            "Question Prompt": row.get("Question Prompt", "N/A"),
-            "Answer A": row.get("Answer A", "N/A"),
-            "Answer B": row.get("Answer B", "N/A"),
-            "Answer C": row.get("Answer C", "N/A"),
-            "Answer D": row.get("Answer D", "N/A"),
-            "Correct Answer": row.get("Correct Answer", "N/A")
-        }
-        output += "### EXAMPLE:\n" + json.dumps(ex_dict) + "\n\n"
-    return output
+        return ""
+
+    return "".join("### EXAMPLE:\n" + _dumps(ex) + "\n\n" for ex in picks)
 
 # =============================================================================
 # THREE NEW FUNCTIONS TO ADD TO prompt_engineer.py
@@ -57,12 +352,16 @@ def get_few_shot_examples(job, example_banks):
 # =============================================================================
 
 
-def create_vocab_list_stage1_prompt(job_list, question_form):
-    """
-    STAGE ONE for vocabulary list upload: Generates complete sentences with correct answers.
-    Includes question form constraints based on user selection.
-    """
-    question_form_instructions = {
+# Static blocks for the vocabulary-list prompts. Providers cache prompt
+# prefixes keyed on the leading tokens, so these constants come first in
+# every message, byte-identical across calls, and the per-batch payload is
+# appended at the end.
+
+_VOCAB_S1_SYSTEM = """You are an expert ELT content creator. You will generate complete test questions in a single JSON response targeting specific vocabulary items provided by the user.
+
+CRITICAL: Your entire response must be a JSON object with a "questions" key containing an array with one question object per vocabulary target."""
+
+_VOCAB_S1_FORM_INSTRUCTIONS = {
         "Random Mix": """
 QUESTION FORM VARIETY: Use diverse question forms across the batch. Include:
 - Simple gap fill (most common): "Our new sidewalk is made of ___________."
@@ -96,49 +395,16 @@ QUESTION FORM CONSTRAINT: ALL questions must use logical relationship completion
 Example: "Tom is not ___________. He has an abundant amount of money."
 The target word should complete the logical connection between clauses.
 """
-    }
-    
-    form_instruction = question_form_instructions.get(question_form, question_form_instructions["Random Mix"])
-    
-    system_msg = f"""You are an expert ELT content creator. You will generate exactly {len(job_list)} complete test questions in a single JSON response targeting specific vocabulary items provided by the user.
-
-CRITICAL: Your entire response must be a JSON object with a "questions" key containing an array of exactly {len(job_list)} question objects."""
-    job_specs = []
-    for job in job_list:
-    # Preprocess target vocabulary to remove slashes and parentheses
-        target_vocab = job['target_vocabulary']
-    
-    # Remove parentheses content: "belong (to)" → "belong"
-        if '(' in target_vocab:
-            target_vocab = target_vocab.split('(')[0].strip()
-    
-    # For slash-separated forms, take the base form (first one)
-    # "blow/blew/blown" → "blow"
-    # "be/was/been over" → "be over"
-        if '/' in target_vocab:
-            target_vocab = target_vocab.split('/')[0].strip()
-    
-        job_specs.append({
-            "job_id": job['job_id'],
-            "cefr": job['cefr'],
-            "target_vocabulary": target_vocab,  # Using cleaned version
-            "definition": job.get('definition', ''),
-            "part_of_speech": job.get('part_of_speech', '')
-        })
- 
-    user_msg = f"""
-TASK: Create exactly {len(job_list)} vocabulary test questions targeting specific vocabulary items.
+}
 
-VOCABULARY TARGETS (one question for each):
-{json.dumps(job_specs, indent=2)}
-
-{form_instruction}
+_VOCAB_S1_INSTRUCTIONS = """
+TASK: Create vocabulary test questions targeting the specific vocabulary items listed at the end of this message, one question per target.
 
 GENERATION INSTRUCTIONS FOR EACH QUESTION:
 
 1. **TARGET VOCABULARY INTEGRATION:** The "Complete Sentence" must contain the target vocabulary item in a natural, authentic context appropriate for the CEFR level. Use the provided definition to ensure accurate usage.
 
-1.5. **INFLECTION REQUIREMENT:** You must conjugate/inflect the target vocabulary to match the sentence context. 
+1.5. **INFLECTION REQUIREMENT:** You must conjugate/inflect the target vocabulary to match the sentence context.
      - Target "blow" in past context → Use "blew"
      - Target "belong" with "it" subject → Use "belongs"
      - Target "be over" in past → Use "was over"
@@ -157,48 +423,104 @@ GENERATION INSTRUCTIONS FOR EACH QUESTION:
 
 7. **ANTI-REPETITION:** Each question must use a unique scenario and context.
 
-MANDATORY OUTPUT FORMAT:
-{{
-  "questions": [
-    {{
-      "Item Number": "...",
-      "Target Vocabulary": "...",
-      "Complete Sentence": "...",
-      "Correct Answer": "...",
-      "Context Clue Location": "...",
-      "Context Clue Explanation": "...",
-      "CEFR rating": "...",
-      "Category": "Vocabulary"
-    }},
-    ... (continue until you have exactly {len(job_list)} question objects)
-  ]
-}}
-
-VERIFICATION: Count your question objects before submitting. You must have exactly {len(job_list)} items in the "questions" array.
+MANDATORY OUTPUT FORMAT: Return a JSON object matching the provided response schema, with a "questions" array of one question object per vocabulary target (Category is always "Vocabulary").
 """
-    return system_msg, user_msg
+
+
+def create_vocab_list_stage1_prompt(job_list, question_form):
+    """
+    STAGE ONE for vocabulary list upload: Generates complete sentences with correct answers.
+    Includes question form constraints based on user selection.
+
+    The instruction blocks lead the message verbatim; only the vocabulary
+    targets and counts vary per call, appended at the end.
+    """
+    form_instruction = _VOCAB_S1_FORM_INSTRUCTIONS.get(question_form, _VOCAB_S1_FORM_INSTRUCTIONS["Random Mix"])
+
+    n = str(len(job_list))
+    job_specs = []
+    for job in job_list:
+    # Preprocess target vocabulary to remove slashes and parentheses
+        target_vocab = job['target_vocabulary']
+    
+    # Remove parentheses content: "belong (to)" → "belong"
+        if '(' in target_vocab:
+            target_vocab = target_vocab.split('(')[0].strip()
+    
+    # For slash-separated forms, take the base form (first one)
+    # "blow/blew/blown" → "blow"
+    # "be/was/been over" → "be over"
+        if '/' in target_vocab:
+            target_vocab = target_vocab.split('/')[0].strip()
+    
+        job_specs.append({
+            "job_id": job['job_id'],
+            "cefr": job['cefr'],
+            "target_vocabulary": target_vocab,  # Using cleaned version
+            "definition": job.get('definition', ''),
+            "part_of_speech": job.get('part_of_speech', '')
+        })
+
+    user_msg = "".join([
+        _VOCAB_S1_INSTRUCTIONS,
+        form_instruction,
+        "\n---\nVOCABULARY TARGETS (create exactly ", n, " questions, one for each):\n",
+        _dumps_payload(job_specs),
+        "\n\nVERIFICATION: Count your question objects before submitting. You must have exactly ",
+        n, " items in the \"questions\" array.\n",
+    ])
+    return _VOCAB_S1_SYSTEM, user_msg
 # =============================================================================
 # HELPER FUNCTIONS FOR DUAL SELECTION
 # =============================================================================
 
+# Compiled once: get_first_word runs on every vocabulary item, and going
+# through re.sub would re-do the pattern cache lookup per call.
+_PAREN_RE = re.compile(r'\([^)]*\)')
+
+
 def get_first_word(vocab_item):
     """
     Extract the first word from multi-word vocabulary items.
     Examples: "clear up" → "clear", "belong (to)" → "belong", "add on" → "add"
     """
     # Remove parentheses and their contents
-    cleaned = re.sub(r'\([^)]*\)', '', vocab_item)
+    cleaned = _PAREN_RE.sub('', vocab_item)
     # Split and get first word
     words = cleaned.strip().split()
     return words[0] if words else vocab_item
 
 
+@functools.lru_cache(maxsize=8192)
 def get_initial_letter(vocab_item):
     """
-    Get the first letter of the first word.
+    Get the first letter of the first word. Words starting with "ph" map to
+    the 'ph' key so the f/ph phonetic pairing actually matches. Memoized:
+    the same items are looked up repeatedly across jobs in a batch.
     """
     first_word = get_first_word(vocab_item)
-    return first_word[0].lower() if first_word else ''
+    if not first_word:
+        return ''
+    lowered = first_word.lower()
+    if lowered.startswith('ph'):
+        return 'ph'
+    return lowered[0]
+
+
+# Shared across all calls instead of re-allocating the mapping per lookup.
+_PHONETIC_GROUPS = {
+    'c': ('k', 'q'),  # hard c sound
+    'k': ('c', 'q'),
+    'q': ('c', 'k'),
+    's': ('c', 'z'),  # soft s/c sound
+    'z': ('s',),
+    'f': ('ph',),
+    'ph': ('f',),
+    'j': ('g',),  # soft g sound
+    'g': ('j',),
+    'i': ('y',),  # initial vowel sounds
+    'y': ('i',)
+}
 
 
 def get_phonetic_similar_letters(letter):
@@ -206,20 +528,52 @@ def get_phonetic_similar_letters(letter):
     Return phonetically similar letters for fallback matching.
     Used when initial letter pool is limited.
     """
-    phonetic_groups = {
-        'c': ['k', 'q'],  # hard c sound
-        'k': ['c', 'q'],
-        'q': ['c', 'k'],
-        's': ['c', 'z'],  # soft s/c sound
-        'z': ['s'],
-        'f': ['ph'],
-        'ph': ['f'],
-        'j': ['g'],  # soft g sound
-        'g': ['j'],
-        'i': ['y'],  # initial vowel sounds
-        'y': ['i']
-    }
-    return phonetic_groups.get(letter.lower(), [])
+    return _PHONETIC_GROUPS.get(letter.lower(), ())
+
+
+# Normalized selection columns for the current vocabulary DataFrame.
+# Computing them as vectorized string kernels once replaces the per-row
+# Python calls the selection functions used to make on every job. Unlike
+# the example banks (pinned for process lifetime by load_example_banks),
+# the uploaded list is replaced on re-upload, so a bare id() key could be
+# recycled and serve pools from the previous list; the single entry here
+# keeps the frame alive and is trusted only for that same object.
+_vocab_norm_cache = None
+
+
+def _get_vocab_norm(vocab_df):
+    global _vocab_norm_cache
+    if _vocab_norm_cache is not None and _vocab_norm_cache[0] is vocab_df:
+        return _vocab_norm_cache[1]
+
+    items = vocab_df['Base Vocabulary Item']
+    item_norm = items.str.lower().str.strip()
+    first_word = (
+        items.str.replace(r'\([^)]*\)', '', regex=True)
+        .str.strip().str.split().str[0]
+    )
+    first_lower = first_word.str.lower()
+    # Same keying as get_initial_letter: "ph" words group under 'ph'.
+    first_letter = (
+        first_lower.str[0].fillna('')
+        .mask(first_lower.str.startswith('ph', na=False), 'ph')
+    )
+    pos_norm = vocab_df['Part of Speech'].str.lower().str.strip()
+
+    # Group once into per-key pools of (item, normalized item) pairs so
+    # each selection call is a dict lookup plus sampling instead of a
+    # DataFrame scan.
+    pairs = list(zip(items, item_norm))
+    pos_index = {}
+    for pair, pos in zip(pairs, pos_norm):
+        pos_index.setdefault(pos, []).append(pair)
+    letter_index = {}
+    for pair, letter in zip(pairs, first_letter):
+        letter_index.setdefault(letter, []).append(pair)
+
+    cached = {"pos_index": pos_index, "letter_index": letter_index}
+    _vocab_norm_cache = (vocab_df, cached)
+    return cached
 
 
 def python_select_by_pos(vocab_df, target_vocab, target_pos, max_items=4):
@@ -229,160 +583,129 @@ def python_select_by_pos(vocab_df, target_vocab, target_pos, max_items=4):
     """
     target_vocab_lower = target_vocab.lower().strip()
     target_pos_lower = target_pos.lower().strip()
-    
-    # Filter by same part of speech
-    same_pos = vocab_df[
-        vocab_df['Part of Speech'].str.lower().str.strip() == target_pos_lower
-    ]
-    
-    # Exclude the target vocabulary
-    same_pos = same_pos[
-        same_pos['Base Vocabulary Item'].str.lower().str.strip() != target_vocab_lower
+
+    pos_index = _get_vocab_norm(vocab_df)["pos_index"]
+
+    # Same part of speech, excluding the target vocabulary
+    pool = [
+        item for item, item_norm in pos_index.get(target_pos_lower, ())
+        if item_norm != target_vocab_lower
     ]
-    
+
     # Randomly select up to max_items
-    if len(same_pos) >= max_items:
-        selected = same_pos.sample(n=max_items)
-    else:
-        selected = same_pos
-    
-    return selected['Base Vocabulary Item'].tolist()
+    if len(pool) >= max_items:
+        return _rng.sample(pool, max_items)
+    return pool
 
 
 def python_select_by_initial_letter(vocab_df, target_vocab, max_items=4, exclude_items=None):
     """
     Select distractors by matching initial letter of first word.
     Includes phonetic fallback if pool is limited.
-    
+
     Args:
         vocab_df: The vocabulary dataframe
         target_vocab: The target vocabulary item
         max_items: Maximum number to select
         exclude_items: List of items to exclude (already selected by POS)
-    
+
     Returns:
         List of vocabulary items matching initial letter
     """
     if exclude_items is None:
         exclude_items = []
-    
-    target_vocab_lower = target_vocab.lower().strip()
+
     target_letter = get_initial_letter(target_vocab)
-    
-    # Get all vocab items with same initial letter
-    def matches_initial_letter(vocab_item):
-        return get_initial_letter(vocab_item) == target_letter
-    
-    same_letter = vocab_df[
-        vocab_df['Base Vocabulary Item'].apply(matches_initial_letter)
-    ]
-    
-    # Exclude target vocab and already-selected items
-    exclude_lower = [item.lower().strip() for item in exclude_items + [target_vocab]]
-    same_letter = same_letter[
-        ~same_letter['Base Vocabulary Item'].str.lower().str.strip().isin(exclude_lower)
+
+    letter_index = _get_vocab_norm(vocab_df)["letter_index"]
+
+    # Get all vocab items with same initial letter, excluding the target
+    # and already-selected items
+    exclude_norm = {item.lower().strip() for item in exclude_items}
+    exclude_norm.add(target_vocab.lower().strip())
+    pool = [
+        item for item, item_norm in letter_index.get(target_letter, ())
+        if item_norm not in exclude_norm
     ]
-    
+
     # If we have enough, select and return
-    if len(same_letter) >= max_items:
-        selected = same_letter.sample(n=max_items)
-        return selected['Base Vocabulary Item'].tolist()
-    
+    if len(pool) >= max_items:
+        return _rng.sample(pool, max_items)
+
     # If pool is limited, collect what we have
-    candidates = same_letter['Base Vocabulary Item'].tolist()
-    
+    candidates = pool
+
     # PHONETIC FALLBACK: Try phonetically similar letters
     phonetic_letters = get_phonetic_similar_letters(target_letter)
-    
+
+    taken = exclude_norm | {c.lower() for c in candidates}
     for phon_letter in phonetic_letters:
         if len(candidates) >= max_items:
             break
-        
-        def matches_phonetic_letter(vocab_item):
-            return get_initial_letter(vocab_item) == phon_letter
-        
-        phonetic_matches = vocab_df[
-            vocab_df['Base Vocabulary Item'].apply(matches_phonetic_letter)
-        ]
-        
-        phonetic_matches = phonetic_matches[
-            ~phonetic_matches['Base Vocabulary Item'].str.lower().str.strip().isin(
-                exclude_lower + [c.lower() for c in candidates]
-            )
+
+        phonetic_matches = [
+            item for item, item_norm in letter_index.get(phon_letter, ())
+            if item_norm not in taken
         ]
-        
+
         needed = max_items - len(candidates)
-        if len(phonetic_matches) > 0:
-            additional = phonetic_matches.sample(n=min(needed, len(phonetic_matches)))
-            candidates.extend(additional['Base Vocabulary Item'].tolist())
-    
+        if phonetic_matches:
+            picked = _rng.sample(phonetic_matches, min(needed, len(phonetic_matches)))
+            candidates.extend(picked)
+            taken.update(p.lower() for p in picked)
+
     return candidates[:max_items]
 
 # =============================================================================
 # MAIN STAGE 2 FUNCTION - DUAL SELECTION + LLM SUPPLEMENTATION
 # =============================================================================
 
-def create_vocab_list_stage2_prompt(job_list, stage1_outputs, vocabulary_list_df):
+def _preselect_for_job(job, stage1_data, vocabulary_list_df):
     """
-    STAGE TWO for vocabulary list: DUAL SELECTION STRATEGY
-    
-    Python performs two selection runs:
-    1. Select up to 4 items by matching Part of Speech
-    2. Select up to 4 items by matching initial letter (with phonetic fallback)
-    
-    LLM supplements to reach 8 total candidates:
-    - Prioritize antonyms of target vocabulary (for adj/verb/adverb/prep)
-    - Fill remainder with synonyms of Python-selected distractors
+    Runs both Python selection passes for one job and packages the result
+    for the stage-2 prompt payload.
     """
-    system_msg = f"""You are an expert ELT test designer specializing in vocabulary assessment. You will supplement pre-selected vocabulary candidates with additional distractors for exactly {len(job_list)} questions.
+    target_vocab = job['target_vocabulary']
+    target_pos = job['part_of_speech']
+
+    # SELECTION RUN 1: By Part of Speech (max 4)
+    pos_selected = python_select_by_pos(
+        vocabulary_list_df,
+        target_vocab,
+        target_pos,
+        max_items=4
+    )
+
+    # SELECTION RUN 2: By Initial Letter (max 4, exclude POS-selected)
+    letter_selected = python_select_by_initial_letter(
+        vocabulary_list_df,
+        target_vocab,
+        max_items=4,
+        exclude_items=pos_selected
+    )
+
+    total_python = len(pos_selected) + len(letter_selected)
+    needed_from_llm = max(0, 8 - total_python)
+
+    return {
+        "Item Number": stage1_data.get("Item Number"),
+        "Target Vocabulary": target_vocab,
+        "Part of Speech": target_pos,
+        "Complete Sentence": stage1_data.get("Complete Sentence"),
+        "Correct Answer": stage1_data.get("Correct Answer"),
+        "POS-selected": pos_selected,
+        "Letter-selected": letter_selected,
+        "Total from vocab list": total_python,
+        "Needed from LLM": needed_from_llm
+    }
 
-CRITICAL: Your entire response must be a JSON object with a "candidates" key containing an array of exactly {len(job_list)} candidate sets."""
-    
-    # PYTHON DUAL SELECTION: POS + Initial Letter
-    pre_selected_data = []
-    
-    for i, job in enumerate(job_list):
-        stage1_data = stage1_outputs[i]
-        target_vocab = job['target_vocabulary']
-        target_pos = job['part_of_speech']
-        
-        # SELECTION RUN 1: By Part of Speech (max 4)
-        pos_selected = python_select_by_pos(
-            vocabulary_list_df,
-            target_vocab,
-            target_pos,
-            max_items=4
-        )
-        
-        # SELECTION RUN 2: By Initial Letter (max 4, exclude POS-selected)
-        letter_selected = python_select_by_initial_letter(
-            vocabulary_list_df,
-            target_vocab,
-            max_items=4,
-            exclude_items=pos_selected
-        )
-        
-        total_python = len(pos_selected) + len(letter_selected)
-        needed_from_llm = max(0, 8 - total_python)
-        
-        pre_selected_data.append({
-            "Item Number": stage1_data.get("Item Number"),
-            "Target Vocabulary": target_vocab,
-            "Part of Speech": target_pos,
-            "Complete Sentence": stage1_data.get("Complete Sentence"),
-            "Correct Answer": stage1_data.get("Correct Answer"),
-            "POS-selected": pos_selected,
-            "Letter-selected": letter_selected,
-            "Total from vocab list": total_python,
-            "Needed from LLM": needed_from_llm
-        })
-    
-    # LLM SUPPLEMENTATION TASK
-    user_msg = f"""
-TASK: Supplement the pre-selected vocabulary candidates to create a pool of exactly 8 distractor candidates for each question.
 
-INPUT (Complete sentences with pre-selected vocabulary):
-{json.dumps(pre_selected_data, indent=2)}
+_VOCAB_S2_SYSTEM = """You are an expert ELT test designer specializing in vocabulary assessment. You will supplement pre-selected vocabulary candidates with additional distractors for each question.
+
+CRITICAL: Your entire response must be a JSON object with a "candidates" key containing an array with one candidate set per question."""
+
+_VOCAB_S2_INSTRUCTIONS = """
+TASK: Supplement the pre-selected vocabulary candidates listed at the end of this message to create a pool of exactly 8 distractor candidates for each question.
 
 BACKGROUND:
 
@@ -420,7 +743,7 @@ CRITICAL CONSTRAINTS:
 
 2. **WORD COUNT LIMIT**: Each generated candidate must be MAXIMUM 1 WORD (no slashes, no multiple forms)
 
-3. **EXACT INFLECTIONAL FORM MATCHING (CRITICAL)**: 
+3. **EXACT INFLECTIONAL FORM MATCHING (CRITICAL)**:
    - Generated candidates must match the PRECISE grammatical form of the target vocabulary
    - Same tense, aspect, person, number, and voice
    - Examples:
@@ -428,15 +751,15 @@ CRITICAL CONSTRAINTS:
      * Target: "blowing" (gerund) → Generate: "boiling", "frying", "baking" (NOT "boil", "fry", "bake")
      * Target: "blows" (3rd singular) → Generate: "boils", "fries", "bakes" (NOT "boil", "fry", "bake")
      * Target: "blow" (base) → Generate: "boil", "fry", "bake" (NOT "boils", "boiled", "boiling")
-   
-   **FORM IDENTIFICATION RULE**: 
+
+   **FORM IDENTIFICATION RULE**:
    - Check the Complete Sentence context
    - If target follows "to" or modal (can/will/should) → BASE FORM
    - If target follows "he/she/it" → 3RD SINGULAR (-s/-es)
    - If target has time marker "yesterday" → PAST TENSE (-ed or irregular)
    - If target follows "is/was/been" → GERUND (-ing) or PAST PARTICIPLE (-ed/-en)
 
-4. **SINGLE WORD ONLY**: 
+4. **SINGLE WORD ONLY**:
    - NEVER use slashes: "blow/blew/blown" is WRONG
    - NEVER list multiple forms: "boil or boiled" is WRONG
    - Each candidate must be ONE inflected form: "boiled" is CORRECT
@@ -480,24 +803,7 @@ Example 4 - Gerund:
 - WRONG: "cook", "dance" (base form)
 - WRONG: "cooked", "danced" (past tense)
 
-MANDATORY OUTPUT FORMAT:
-{{
-  "candidates": [
-    {{
-      "Item Number": "...",
-      "Candidate A": "...[from POS-selected or Letter-selected or LLM-generated]...",
-      "Candidate B": "...[from POS-selected or Letter-selected or LLM-generated]...",
-      "Candidate C": "...[from POS-selected or Letter-selected or LLM-generated]...",
-      "Candidate D": "...[from POS-selected or Letter-selected or LLM-generated]...",
-      "Candidate E": "...[from POS-selected or Letter-selected or LLM-generated]...",
-      "Candidate F": "...[from POS-selected or Letter-selected or LLM-generated]...",
-      "Candidate G": "...[from POS-selected or Letter-selected or LLM-generated]...",
-      "Candidate H": "...[from POS-selected or Letter-selected or LLM-generated]...",
-      "Source Notes": "e.g., 'A-D from vocab list, E antonym of target, F-H synonyms of list items'"
-    }},
-    ... (exactly {len(job_list)} candidate sets)
-  ]
-}}
+MANDATORY OUTPUT FORMAT: Return a JSON object matching the provided response schema, with a "candidates" array of one candidate set per question. Candidates A-H each come from POS-selected, Letter-selected, or LLM-generated; Source Notes records the split (e.g., 'A-D from vocab list, E antonym of target, F-H synonyms of list items').
 
 EXAMPLE:
 
@@ -516,10 +822,42 @@ Output Candidates:
 - F: "safe" (LLM antonym of "dangerous")
 - G: "peaceful" (LLM synonym of "calm")
 - H: "transparent" (LLM synonym of "clear")
-
-VERIFICATION: You must generate exactly {len(job_list)} candidate sets with exactly 8 candidates each.
 """
-    return system_msg, user_msg
+
+
+def create_vocab_list_stage2_prompt(job_list, stage1_outputs, vocabulary_list_df):
+    """
+    STAGE TWO for vocabulary list: DUAL SELECTION STRATEGY
+
+    Python performs two selection runs:
+    1. Select up to 4 items by matching Part of Speech
+    2. Select up to 4 items by matching initial letter (with phonetic fallback)
+
+    LLM supplements to reach 8 total candidates:
+    - Prioritize antonyms of target vocabulary (for adj/verb/adverb/prep)
+    - Fill remainder with synonyms of Python-selected distractors
+
+    The static supplementation instructions lead the message; the per-batch
+    pre-selected data trails, keeping the prefix cache-stable.
+    """
+    n = str(len(job_list))
+
+    # PYTHON DUAL SELECTION: POS + Initial Letter
+    pre_selected_data = [
+        _preselect_for_job(job, stage1_data, vocabulary_list_df)
+        for job, stage1_data in zip(job_list, stage1_outputs)
+    ]
+
+    # LLM SUPPLEMENTATION TASK
+    user_msg = "".join([
+        _VOCAB_S2_INSTRUCTIONS,
+        "\n---\nINPUT (Complete sentences with pre-selected vocabulary; exactly ",
+        n, " questions):\n",
+        _dumps_payload(pre_selected_data),
+        "\n\nVERIFICATION: You must generate exactly ", n,
+        " candidate sets with exactly 8 candidates each.\n",
+    ])
+    return _VOCAB_S2_SYSTEM, user_msg
 
 
 # =============================================================================
@@ -542,39 +880,12 @@ VERIFICATION: You must generate exactly {len(job_list)} candidate sets with exac
 # then narrow down to the final 3 distractors.
 # =============================================================================
 
-def create_vocab_list_stage3_prompt(job_list, stage1_outputs, stage2_outputs):
-    """
-    STAGE THREE for vocabulary list: Binary validation with PRAGMATIC FILTERING.
-    IMPROVED: Explicit collocation and semantic compatibility checks.
-    """
-    system_msg = f"""You are an expert English vocabulary validator with deep knowledge of collocations and pragmatic appropriateness. You will evaluate candidate distractors for exactly {len(job_list)} vocabulary questions and return your validated selections in a JSON object with a "validated" key."""
-    
-    validation_input = []
-    for i, (job, s1, s2) in enumerate(zip(job_list, stage1_outputs, stage2_outputs)):
-        complete_sentence = s1.get("Complete Sentence", "")
-        correct_answer = s1.get("Correct Answer", "")
-        
-        validation_input.append({
-            "Item Number": s1.get("Item Number", ""),
-            "Target Vocabulary": s1.get("Target Vocabulary", ""),
-            "Complete Sentence": complete_sentence,
-            "Correct Answer": correct_answer,
-            "Candidate A": s2.get("Candidate A", ""),
-            "Candidate B": s2.get("Candidate B", ""),
-            "Candidate C": s2.get("Candidate C", ""),
-            "Candidate D": s2.get("Candidate D", ""),
-            "Candidate E": s2.get("Candidate E", ""),
-            "Candidate F": s2.get("Candidate F", ""),
-            "Candidate G": s2.get("Candidate G", ""),
-            "Candidate H": s2.get("Candidate H", ""),
-            "CEFR": job['cefr']
-        })
-    
-    user_msg = f"""
-TASK: Validate candidate distractors for ALL {len(job_list)} VOCABULARY questions and select the final three distractors per question.
+_VOCAB_S3_SYSTEM = """You are an expert English vocabulary validator with deep knowledge of collocations and pragmatic appropriateness. You will evaluate candidate distractors for each vocabulary question and return your validated selections in a JSON object with a "validated" key."""
+
+_VOCAB_S3_INSTRUCTIONS = """
+TASK: Validate the candidate distractors for ALL vocabulary questions listed at the end of this message and select the final three distractors per question.
 
-VALIDATION INPUT:
-{json.dumps(validation_input, indent=2)}
+VALIDATION INPUT SCHEMA: each entry is {"id": item number, "sent": complete sentence, "ans": correct answer, "cands": array of 8 candidate distractors, "cefr": CEFR level}.
 
 VALIDATION PROCEDURE:
 
@@ -649,23 +960,44 @@ From candidates that pass Tiers 1 and 2, select the BEST THREE based on:
 - CEFR-appropriate challenge (requires thought to eliminate, not instantly obvious)
 - Avoid selecting multiple candidates from same semantic field
 
-MANDATORY OUTPUT FORMAT:
-{{
-  "validated": [
-    {{
-      "Item Number": "...",
-      "Selected Distractor A": "...",
-      "Selected Distractor B": "...",
-      "Selected Distractor C": "...",
-      "Validation Notes": "Brief explanation: [X] rejected for collocation violations, [Y] rejected for semantic absurdity, selected [ABC] for plausibility"
-    }},
-    ... (exactly {len(job_list)} validated sets)
-  ]
-}}
-
-VERIFICATION: You must provide exactly {len(job_list)} validated distractor sets with exactly 3 selected distractors each.
+MANDATORY OUTPUT FORMAT: Return a JSON object matching the provided response schema, with a "validated" array of one entry per question: "id" matches the input entry, "picks" holds exactly the three selected distractors, and "notes" briefly explains rejections and selections.
 """
-    return system_msg, user_msg
+
+
+def create_vocab_list_stage3_prompt(job_list, stage1_outputs, stage2_outputs):
+    """
+    STAGE THREE for vocabulary list: Binary validation with PRAGMATIC FILTERING.
+    IMPROVED: Explicit collocation and semantic compatibility checks.
+
+    The validation procedure leads the message verbatim; the per-batch
+    validation input trails, keeping the prefix cache-stable.
+    """
+    n = str(len(job_list))
+
+    validation_input = []
+    for job, s1, s2 in zip(job_list, stage1_outputs, stage2_outputs):
+        complete_sentence = s1.get("Complete Sentence", "")
+        correct_answer = s1.get("Correct Answer", "")
+
+        # Compact positional schema (documented once in the instructions)
+        # instead of repeating eight "Candidate X" keys per entry — the
+        # candidate payload dominates this prompt's token count.
+        validation_input.append({
+            "id": s1.get("Item Number", ""),
+            "sent": complete_sentence,
+            "ans": correct_answer,
+            "cands": [s2.get(f"Candidate {c}", "") for c in "ABCDEFGH"],
+            "cefr": job['cefr']
+        })
+
+    user_msg = "".join([
+        _VOCAB_S3_INSTRUCTIONS,
+        "\n---\nVALIDATION INPUT (exactly ", n, " questions):\n",
+        _dumps_payload(validation_input),
+        "\n\nVERIFICATION: You must provide exactly ", n,
+        " validated distractor sets with exactly 3 selected distractors each.\n",
+    ])
+    return _VOCAB_S3_SYSTEM, user_msg
 
 # INTEGRATION INSTRUCTIONS:
 # Replace the existing create_vocab_list_stage3_prompt function in prompt_engineer.py
@@ -680,47 +1012,18 @@ VERIFICATION: You must provide exactly {len(job_list)} validated distractor sets
 # Strategy: Sequential BATCH MODE - THREE-STAGE ARCHITECTURE (MINIMAL FIXES)
 # --------------------------------------------------------------------------
 
-def create_sequential_batch_stage1_prompt(job_list, example_banks):
-    """
-    STAGE ONE: Generates complete sentences with correct answers and context clues for ALL jobs at once.
-    Includes multi-word phrase splitting strategy and distinguishes between 
-    grammatical versus semantic constraint requirements.
-    """
-    examples = get_few_shot_examples(job_list[0], example_banks) if job_list else ""
-    
-    system_msg = f"""You are an expert ELT content creator. You will generate exactly {len(job_list)} complete test questions in a single JSON response. 
+# Static prompt blocks for Stage 1 live at module level so every call reuses
+# the same string objects. Keeping the static prefix byte-identical across
+# calls also lets provider-side prompt-prefix caches hit instead of treating
+# each batch as a brand-new prompt.
 
-CRITICAL: Your entire response must be a JSON object with a "questions" key containing an array of exactly {len(job_list)} question objects. Do not generate fewer questions than requested."""
-    
-    # Build the batch specification
-    job_specs = []
-    has_grammar_distinction = False
-    has_vocabulary = False
-    
-    for job in job_list:
-        raw_context = job.get('context', 'General')
-        main_topic = raw_context
-        
-        job_specs.append({
-            "job_id": job['job_id'],
-            "cefr": job['cefr'],
-            "type": job['type'],
-            "focus": job['focus'],
-            "topic": main_topic
-        })
-        
-        if job['type'] == 'Grammar' and 'vs' in job['focus'].lower():
-            has_grammar_distinction = True
-        if job['type'] == 'Vocabulary':
-            has_vocabulary = True
-    
-    # Determine appropriate constraint instruction
-    constraint_instruction = ""
-    
-    if has_grammar_distinction:
-        constraint_instruction += """
+_STAGE1_SYSTEM = """You are an expert ELT content creator. You will generate every requested test question in a single JSON response.
+
+CRITICAL: Your entire response must be a JSON object with a "questions" key containing one question object per job specification. Do not generate fewer questions than requested."""
+
+_STAGE1_CONSTRAINT_GRAMMAR = """
 GRAMMATICAL EXCLUSIVITY RULE (for grammar distinction questions):
-When the Assessment Focus contains "vs" (e.g., "going to vs will", "Past Simple vs Present Perfect"), 
+When the Assessment Focus contains "vs" (e.g., "going to vs will", "Past Simple vs Present Perfect"),
 the Complete Sentence MUST include a GRAMMATICAL SIGNAL that makes only the correct answer structurally valid.
 
 Examples of grammatical signals:
@@ -732,9 +1035,8 @@ Examples of grammatical signals:
 
 The distractors should be GRAMMATICALLY INCOMPATIBLE with the sentence structure, not merely semantically weaker.
 """
-    
-    if has_vocabulary:
-        constraint_instruction += """
+
+_STAGE1_CONSTRAINT_VOCAB = """
 SEMANTIC EXCLUSIVITY RULE (for vocabulary questions):
 The Complete Sentence must contain SEMANTIC CONTEXT CLUES that make only the correct answer logically appropriate.
 
@@ -745,17 +1047,8 @@ Context clue strategies by level:
 
 The distractors should be SEMANTICALLY INCOMPATIBLE or IDIOMATICALLY WRONG with the context, even if grammatically valid.
 """
-    
-    user_msg = f"""
-TASK: Create exactly {len(job_list)} complete, original test questions from scratch.
-
-You must generate ALL {len(job_list)} questions in this single response. Each question specification below MUST have a corresponding question in your output.
-
-JOB SPECIFICATIONS (one question for each):
-{json.dumps(job_specs, indent=2)}
-
-{constraint_instruction}
 
+_STAGE1_INSTRUCTIONS = """
 GENERATION INSTRUCTIONS FOR EACH QUESTION:
 
 1. **ANTI-REPETITION (CRITICAL):** Each question must have a UNIQUE topic and scenario. Do NOT reuse themes, contexts, or vocabulary across questions.
@@ -776,55 +1069,162 @@ GENERATION INSTRUCTIONS FOR EACH QUESTION:
 
 9. **LOGICAL COHERENCE CHECK:** Review your complete sentence to ensure it is semantically coherent and factually plausible. Avoid nonsensical combinations such as "The meeting was cancelled so we put it off until next month" where the actions contradict each other.
 
-MANDATORY OUTPUT FORMAT:
-{{
-  "questions": [
-    {{
-      "Item Number": "...",
-      "Assessment Focus": "...",
-      "Complete Sentence": "...[sentence with answer visible]...",
-      "Correct Answer": "...",
-      "Context Clue Location": "...[which phrase/clause]...",
-      "Context Clue Explanation": "...[why this eliminates alternatives]...",
-      "CEFR rating": "...",
-      "Category": "..."
-    }},
-    {{
-      "Item Number": "...",
-      "Assessment Focus": "...",
-      "Complete Sentence": "...",
-      "Correct Answer": "...",
-      "Context Clue Location": "...",
-      "Context Clue Explanation": "...",
-      "CEFR rating": "...",
-      "Category": "..."
-    }}
-    ... (continue until you have exactly {len(job_list)} question objects)
-  ]
-}}
+MANDATORY OUTPUT FORMAT: Return a JSON object matching the provided response schema, with a "questions" array containing one question object per job specification.
+"""
 
-VERIFICATION: Count your question objects before submitting. You must have exactly {len(job_list)} items in the "questions" array.
 
-STYLE REFERENCE (format guide only - do not copy scenarios):
-{examples}
-"""
-    return system_msg, user_msg
+# All four constraint-block combinations, preconcatenated at import and
+# indexed by (has_grammar_distinction, has_vocabulary), so selecting one is
+# a tuple lookup with no runtime string building.
+_STAGE1_CONSTRAINT_TABLE = (
+    "",
+    _STAGE1_CONSTRAINT_VOCAB,
+    _STAGE1_CONSTRAINT_GRAMMAR,
+    _STAGE1_CONSTRAINT_GRAMMAR + _STAGE1_CONSTRAINT_VOCAB,
+)
 
 
-def create_sequential_batch_stage2_grammar_prompt(job_list, stage1_outputs):
+def _build_stage1_constraints(has_grammar_distinction, has_vocabulary):
+    """Returns the constraint block for the given flag combination."""
+    return _STAGE1_CONSTRAINT_TABLE[2 * bool(has_grammar_distinction) + bool(has_vocabulary)]
+
+
+@functools.lru_cache(maxsize=8)
+def _stage1_static(has_grammar_distinction, has_vocabulary):
     """
-    STAGE TWO (GRAMMAR): Generates candidate distractor pools for grammar questions.
-    MINIMAL FIXES: Lexical overlap prohibition, target form coverage, proficiency-appropriate errors.
+    Compiles the static lead of the stage-1 user message: task statement,
+    constraint blocks, and generation instructions. Nothing in it depends
+    on the batch, so it is byte-identical across same-shape calls and
+    forms the provider-cacheable prefix; counts and specs go in the tail.
     """
-    system_msg = f"""You are an expert ELT test designer specializing in grammar assessment. You will generate candidate distractors for exactly {len(job_list)} grammar questions in a single JSON response with a "candidates" key."""
-    
-    user_msg = f"""
-TASK: Generate 5 candidate distractors for ALL {len(job_list)} GRAMMAR questions.
+    return "".join([
+        "\nTASK: Create complete, original test questions from scratch, one for each job specification listed at the end of this message.\n",
+        _build_stage1_constraints(has_grammar_distinction, has_vocabulary),
+        _STAGE1_INSTRUCTIONS,
+        "\nSTYLE REFERENCE (format guide only - do not copy scenarios):\n",
+    ])
+
+
+# Rough chars-per-token ratio for English/JSON prompt text. Deliberately
+# conservative so packed batches land under the budget with headroom.
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Cheap token estimate for batch packing (no tokenizer dependency)."""
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def split_into_token_bounded_batches(job_list, build_prompt, max_input_tokens=96000):
+    """
+    Greedily packs jobs into batches whose built prompt stays under an
+    estimated max_input_tokens. The static template cost is measured once
+    by building the prompt for an empty batch; each job then only adds its
+    own serialized marginal estimate. Returns a list of job_list slices in
+    input order.
+    """
+    if not job_list:
+        return []
+
+    sys_msg, user_msg = build_prompt([])
+    base = estimate_tokens(sys_msg) + estimate_tokens(user_msg)
+
+    batches = []
+    current = []
+    budget = base
+    for job in job_list:
+        marginal = estimate_tokens(_dumps(job)) + 1
+        if current and budget + marginal > max_input_tokens:
+            batches.append(current)
+            current = []
+            budget = base
+        current.append(job)
+        budget += marginal
+    batches.append(current)
+    return batches
+
+
+def job_sort_key(job):
+    """
+    Deterministic ordering for prompt building. Provider prompt caches key
+    on byte-exact prefixes, so the same job set must serialize identically
+    regardless of arrival order.
+    """
+    return (job['type'], str(job['cefr']), job['focus'], str(job['job_id']))
+
+
+def classify_jobs(job_list):
+    """
+    Classifies a batch by question type once, up front. Returns boolean
+    masks plus the matching position arrays so every downstream consumer
+    (constraint-block selection, stage-2 partitioning) reads precomputed
+    indices instead of re-scanning the job list with per-job string checks.
+    """
+    count = len(job_list)
+    is_grammar = np.fromiter(
+        (job['type'] == 'Grammar' for job in job_list), dtype=bool, count=count
+    )
+    is_vocab = np.fromiter(
+        (job['type'] == 'Vocabulary' for job in job_list), dtype=bool, count=count
+    )
+    is_grammar_vs = np.fromiter(
+        (g and 'vs' in job['focus'].lower() for g, job in zip(is_grammar, job_list)),
+        dtype=bool, count=count
+    )
+    return {
+        "is_grammar": is_grammar,
+        "is_vocab": is_vocab,
+        "is_grammar_vs": is_grammar_vs,
+        "grammar_idx": np.flatnonzero(is_grammar),
+        "vocab_idx": np.flatnonzero(is_vocab),
+    }
 
-INPUT FROM STAGE 1 (Complete sentences with correct answers):
-{json.dumps(stage1_outputs, indent=2)}
 
-GENERATION INSTRUCTIONS:
+def create_sequential_batch_stage1_prompt(job_list, example_banks, classification=None):
+    """
+    STAGE ONE: Generates complete sentences with correct answers and context clues for ALL jobs at once.
+    Includes multi-word phrase splitting strategy and distinguishes between
+    grammatical versus semantic constraint requirements.
+
+    The static instruction blocks are module-level constants; the dynamic
+    pieces (counts, job specs, examples) are appended after them so the
+    shared prefix stays stable across calls. Callers that already ran
+    classify_jobs can pass the result in to skip the re-scan.
+    """
+    examples = get_few_shot_examples(job_list[0], example_banks) if job_list else ""
+
+    n = str(len(job_list))
+    job_specs = [
+        [
+            job['job_id'],
+            _intern(str(job['cefr'])),
+            _intern(job['type']),
+            _intern(job['focus']),
+            job.get('context', 'General'),
+        ]
+        for job in job_list
+    ]
+    if classification is None:
+        classification = classify_jobs(job_list)
+    has_grammar_distinction = bool(classification["is_grammar_vs"].any())
+    has_vocabulary = bool(classification["is_vocab"].any())
+
+    user_msg = "".join([
+        _stage1_static(has_grammar_distinction, has_vocabulary),
+        examples,
+        "\n---\nJOB SPECIFICATIONS (create exactly ", n, " questions, one for each; each row: [job_id, cefr, type, focus, topic]):\n",
+        _dumps_payload(job_specs),
+        "\n\nVERIFICATION: Count your question objects before submitting. You must have exactly ", n, " items in the \"questions\" array.\n",
+    ])
+    return _STAGE1_SYSTEM, user_msg
+
+
+# Stage-2 instruction bodies are invariant across calls; only the batch
+# size and the stage-1 payload vary. Keeping them as module constants means
+# each call assembles the user message from a handful of pieces instead of
+# re-evaluating a multi-KB f-string.
+
+_S2_GRAMMAR_INSTRUCTIONS = """GENERATION INSTRUCTIONS:
 
 For EACH question, generate 5 alternative options that replace the Correct Answer in the Complete Sentence. Your alternatives must render the sentence grammatically incorrect, but should be plausible errors that intermediate learners (CEFR A2-B2) might produce.
 
@@ -858,42 +1258,9 @@ VERIFICATION: Before submitting, scan the post-blank text and ensure no candidat
 
 8. **NO LEXICAL OVERLAP WITH CORRECT ANSWER:** Do not use any form of the correct answer word or its root in candidates unless testing word form distinctions.
 
-9. **ANTI-REPETITION:** Avoid using identical candidate words across multiple questions in this batch unless required by the Assessment Focus.
-
-MANDATORY OUTPUT FORMAT:
-{{
-  "candidates": [
-    {{
-      "Item Number": "...",
-      "Candidate A": "...[max 3 words]...",
-      "Candidate B": "...[max 3 words]...",
-      "Candidate C": "...[max 3 words]...",
-      "Candidate D": "...[max 3 words]...",
-      "Candidate E": "...[max 3 words]..."
-    }},
-    ... (exactly {len(job_list)} candidate sets)
-  ]
-}}
-
-VERIFICATION: You must generate exactly {len(job_list)} candidate sets with 5 candidates each.
-"""
-    return system_msg, user_msg
-
-
-def create_sequential_batch_stage2_vocabulary_prompt(job_list, stage1_outputs):
-    """
-    STAGE TWO (VOCABULARY): Generates candidate distractor pools for vocabulary questions.
-    MINIMAL FIX: Exact inflectional form matching with concrete examples.
-    """
-    system_msg = f"""You are an expert ELT test designer specializing in vocabulary assessment. You will generate candidate distractors for exactly {len(job_list)} vocabulary questions in a single JSON response with a "candidates" key."""
-    
-    user_msg = f"""
-TASK: Generate 5 candidate distractors for ALL {len(job_list)} VOCABULARY questions.
-
-INPUT FROM STAGE 1 (Complete sentences with correct answers):
-{json.dumps(stage1_outputs, indent=2)}
+9. **ANTI-REPETITION:** Avoid using identical candidate words across multiple questions in this batch unless required by the Assessment Focus."""
 
-GENERATION INSTRUCTIONS:
+_S2_VOCAB_INSTRUCTIONS = """GENERATION INSTRUCTIONS:
 
 For EACH question, generate 5 alternative options that replace the Correct Answer in the Complete Sentence. Your alternatives must render the sentence contextually inappropriate through collocational mismatch, idiomatic violation, or register conflict, while maintaining grammatical correctness.
 
@@ -944,59 +1311,103 @@ Examples of VIOLATIONS:
 
 VERIFICATION: Scan the post-blank text and ensure no candidates repeat those words.
 
-10. **ANTI-REPETITION:** Avoid using identical candidate words across multiple questions in this batch.
+10. **ANTI-REPETITION:** Avoid using identical candidate words across multiple questions in this batch."""
 
-MANDATORY OUTPUT FORMAT:
-{{
-  "candidates": [
-    {{
-      "Item Number": "...",
-      "Candidate A": "...[max 3 words]...",
-      "Candidate B": "...[max 3 words]...",
-      "Candidate C": "...[max 3 words]...",
-      "Candidate D": "...[max 3 words]...",
-      "Candidate E": "...[max 3 words]..."
-    }},
-    ... (exactly {len(job_list)} candidate sets)
-  ]
-}}
 
-VERIFICATION: You must generate exactly {len(job_list)} candidate sets with 5 candidates each.
-"""
+def _stage2_user_msg(n, payload, category, instructions):
+    return "".join([
+        "\nTASK: Generate 5 candidate distractors for ALL ", category, " questions listed at the end of this message.\n\n",
+        instructions,
+        "\n\nMANDATORY OUTPUT FORMAT: Return a JSON object matching the provided response schema, with a \"candidates\" array of one candidate set per question (Candidate A-E, max 3 words each).\n",
+        "\n---\nINPUT FROM STAGE 1 (Complete sentences with correct answers; exactly ", n, " questions):\n",
+        payload,
+        "\n\nVERIFICATION: You must generate exactly ", n, " candidate sets with 5 candidates each.\n",
+    ])
+
+
+def create_sequential_batch_stage2_grammar_prompt(job_list, stage1_outputs):
+    """
+    STAGE TWO (GRAMMAR): Generates candidate distractor pools for grammar questions.
+    MINIMAL FIXES: Lexical overlap prohibition, target form coverage, proficiency-appropriate errors.
+    """
+    n = str(len(job_list))
+    system_msg = """You are an expert ELT test designer specializing in grammar assessment. You will generate candidate distractors for every grammar question in a single JSON response with a "candidates" key."""
+    user_msg = _stage2_user_msg(n, _dumps_payload(_project_stage1(stage1_outputs)), "GRAMMAR", _S2_GRAMMAR_INSTRUCTIONS)
     return system_msg, user_msg
 
 
-def create_sequential_batch_stage3_grammar_prompt(job_list, stage1_outputs, stage2_outputs):
+def create_sequential_batch_stage2_vocabulary_prompt(job_list, stage1_outputs):
     """
-    STAGE THREE (GRAMMAR): Binary validation with filtering authority.
-    MINIMAL FIX: Proficiency-appropriate error checking with rejection of too-easy errors.
+    STAGE TWO (VOCABULARY): Generates candidate distractor pools for vocabulary questions.
+    MINIMAL FIX: Exact inflectional form matching with concrete examples.
     """
-    system_msg = f"""You are an expert English grammar validator. You will evaluate candidate distractors for exactly {len(job_list)} grammar questions and return your validated selections in a JSON object with a "validated" key."""
-    
-    # Construct validation input combining Stage 1 and Stage 2 data
-    validation_input = []
-    for i, (job, s1, s2) in enumerate(zip(job_list, stage1_outputs, stage2_outputs)):
-        complete_sentence = s1.get("Complete Sentence", "")
-        correct_answer = s1.get("Correct Answer", "")
-        
-        validation_input.append({
-            "Item Number": s1.get("Item Number", ""),
-            "Assessment Focus": s1.get("Assessment Focus", ""),
-            "Complete Sentence": complete_sentence,
-            "Correct Answer": correct_answer,
-            "Candidate A": s2.get("Candidate A", ""),
-            "Candidate B": s2.get("Candidate B", ""),
-            "Candidate C": s2.get("Candidate C", ""),
-            "Candidate D": s2.get("Candidate D", ""),
-            "Candidate E": s2.get("Candidate E", ""),
-            "CEFR": job['cefr']
-        })
-    
-    user_msg = f"""
-TASK: Validate candidate distractors for ALL {len(job_list)} GRAMMAR questions and select the final three distractors per question.
+    n = str(len(job_list))
+    system_msg = """You are an expert ELT test designer specializing in vocabulary assessment. You will generate candidate distractors for every vocabulary question in a single JSON response with a "candidates" key."""
+    user_msg = _stage2_user_msg(n, _dumps_payload(_project_stage1(stage1_outputs)), "VOCABULARY", _S2_VOCAB_INSTRUCTIONS)
+    return system_msg, user_msg
+
+
+# Keys the stage-3 builders read from upstream outputs. Normalizing rows
+# against these once lets the validation-input build use direct indexing
+# instead of hundreds of per-row dict.get calls.
+_STAGE1_OUTPUT_KEYS = ("Item Number", "Assessment Focus", "Complete Sentence", "Correct Answer")
+_CANDIDATE_KEYS = ("Candidate A", "Candidate B", "Candidate C", "Candidate D", "Candidate E")
+
+
+def _with_defaults(rows, keys):
+    """Returns rows with every key in `keys` guaranteed present (default "")."""
+    defaults = dict.fromkeys(keys, "")
+    return [{**defaults, **row} for row in rows]
+
+
+def _project_stage1(stage1_outputs):
+    """
+    Projects stage-1 rows to the fields stage 2 actually reads. Echoing the
+    full rows (context clue text, CEFR, Category) roughly doubled the
+    stage-2 payload for no benefit to candidate generation.
+    """
+    return [
+        {key: row.get(key, "") for key in _STAGE1_OUTPUT_KEYS}
+        for row in stage1_outputs
+    ]
+
+
+def _build_validation_input(job_list, stage1_outputs, stage2_outputs):
+    """
+    Joins Stage 1 sentences with Stage 2 candidates for the stage-3 prompts.
 
-VALIDATION INPUT:
-{json.dumps(validation_input, indent=2)}
+    Emitted as positional rows (legend in _S3_INPUT_LEGEND) rather than
+    dicts: repeating ten verbose keys per question roughly doubled the
+    payload token count on large batches.
+    """
+    stage1_outputs = _with_defaults(stage1_outputs, _STAGE1_OUTPUT_KEYS)
+    stage2_outputs = _with_defaults(stage2_outputs, _CANDIDATE_KEYS)
+    return [
+        [
+            s1["Item Number"],
+            s1["Assessment Focus"],
+            s1["Complete Sentence"],
+            s1["Correct Answer"],
+            s2["Candidate A"],
+            s2["Candidate B"],
+            s2["Candidate C"],
+            s2["Candidate D"],
+            s2["Candidate E"],
+            job['cefr'],
+        ]
+        for job, s1, s2 in zip(job_list, stage1_outputs, stage2_outputs)
+    ]
+
+
+_S3_INPUT_LEGEND = """
+VALIDATION INPUT SCHEMA: each entry is a positional row [Item Number, Assessment Focus, Complete Sentence, Correct Answer, Candidate A, Candidate B, Candidate C, Candidate D, Candidate E, CEFR].
+"""
+
+
+_S3_GRAMMAR_SYSTEM = """You are an expert English grammar validator. You will evaluate candidate distractors for each grammar question and return your validated selections in a JSON object with a "validated" key."""
+
+_S3_GRAMMAR_INSTRUCTIONS = """
+TASK: Validate candidate distractors for ALL GRAMMAR questions listed at the end of this message and select the final three distractors per question.
 
 VALIDATION PROCEDURE:
 
@@ -1043,56 +1454,38 @@ PROFICIENCY CHECK EXAMPLES:
 - B2 conditional + "If I will know" distractor → REJECT (A2-level error, too easy for B2)
 - A2 past tense + "goed" distractor → ACCEPT (appropriate A2-level error)
 
-MANDATORY OUTPUT FORMAT:
-{{
-  "validated": [
-    {{
-      "Item Number": "...",
-      "Selected Distractor A": "...",
-      "Selected Distractor B": "...",
-      "Selected Distractor C": "...",
-      "Validation Notes": "Brief explanation of which candidates passed/failed and why"
-    }},
-    ... (exactly {len(job_list)} validated sets)
-  ]
-}}
-
-VERIFICATION: You must provide exactly {len(job_list)} validated distractor sets with exactly 3 selected distractors each.
+MANDATORY OUTPUT FORMAT: Return a JSON object matching the provided response schema, with a "validated" array of one set per question (Selected Distractor A-C plus brief Validation Notes).
 """
-    return system_msg, user_msg
 
 
-def create_sequential_batch_stage3_vocabulary_prompt(job_list, stage1_outputs, stage2_outputs):
+def create_sequential_batch_stage3_grammar_prompt(job_list, stage1_outputs, stage2_outputs):
     """
-    STAGE THREE (VOCABULARY): Binary validation with filtering authority.
-    MINIMAL FIX: Native speaker acceptability check to reject multiple correct answers.
+    STAGE THREE (GRAMMAR): Binary validation with filtering authority.
+    MINIMAL FIX: Proficiency-appropriate error checking with rejection of too-easy errors.
+
+    The validation procedure is a module constant leading the message;
+    the per-batch payload and counts trail it.
     """
-    system_msg = f"""You are an expert English vocabulary validator. You will evaluate candidate distractors for exactly {len(job_list)} vocabulary questions and return your validated selections in a JSON object with a "validated" key."""
-    
+    n = str(len(job_list))
+
     # Construct validation input combining Stage 1 and Stage 2 data
-    validation_input = []
-    for i, (job, s1, s2) in enumerate(zip(job_list, stage1_outputs, stage2_outputs)):
-        complete_sentence = s1.get("Complete Sentence", "")
-        correct_answer = s1.get("Correct Answer", "")
-        
-        validation_input.append({
-            "Item Number": s1.get("Item Number", ""),
-            "Assessment Focus": s1.get("Assessment Focus", ""),
-            "Complete Sentence": complete_sentence,
-            "Correct Answer": correct_answer,
-            "Candidate A": s2.get("Candidate A", ""),
-            "Candidate B": s2.get("Candidate B", ""),
-            "Candidate C": s2.get("Candidate C", ""),
-            "Candidate D": s2.get("Candidate D", ""),
-            "Candidate E": s2.get("Candidate E", ""),
-            "CEFR": job['cefr']
-        })
-    
-    user_msg = f"""
-TASK: Validate candidate distractors for ALL {len(job_list)} VOCABULARY questions and select the final three distractors per question.
+    validation_input = _build_validation_input(job_list, stage1_outputs, stage2_outputs)
+
+    user_msg = "".join([
+        _S3_GRAMMAR_INSTRUCTIONS,
+        _S3_INPUT_LEGEND,
+        "\n---\nVALIDATION INPUT (exactly ", n, " questions):\n",
+        _dumps_payload(validation_input),
+        "\n\nVERIFICATION: You must provide exactly ", n,
+        " validated distractor sets with exactly 3 selected distractors each.\n",
+    ])
+    return _S3_GRAMMAR_SYSTEM, user_msg
+
 
-VALIDATION INPUT:
-{json.dumps(validation_input, indent=2)}
+_S3_VOCAB_SYSTEM = """You are an expert English vocabulary validator. You will evaluate candidate distractors for each vocabulary question and return your validated selections in a JSON object with a "validated" key."""
+
+_S3_VOCAB_INSTRUCTIONS = """
+TASK: Validate candidate distractors for ALL VOCABULARY questions listed at the end of this message and select the final three distractors per question.
 
 VALIDATION PROCEDURE:
 
@@ -1142,23 +1535,101 @@ NATIVE SPEAKER ACCEPTABILITY EXAMPLES:
 - "likes to mess with engines" when correct answer is "tinker with" → REJECT (both acceptable colloquially)
 - "managed to pile up money" when correct answer is "squirrel away" → ACCEPT (collocational mismatch)
 
-MANDATORY OUTPUT FORMAT:
-{{
-  "validated": [
-    {{
-      "Item Number": "...",
-      "Selected Distractor A": "...",
-      "Selected Distractor B": "...",
-      "Selected Distractor C": "...",
-      "Validation Notes": "Brief explanation of which candidates passed/failed and why"
-    }},
-    ... (exactly {len(job_list)} validated sets)
-  ]
-}}
-
-VERIFICATION: You must provide exactly {len(job_list)} validated distractor sets with exactly 3 selected distractors each.
+MANDATORY OUTPUT FORMAT: Return a JSON object matching the provided response schema, with a "validated" array of one set per question (Selected Distractor A-C plus brief Validation Notes).
 """
-    return system_msg, user_msg
+
+
+def create_sequential_batch_stage3_vocabulary_prompt(job_list, stage1_outputs, stage2_outputs):
+    """
+    STAGE THREE (VOCABULARY): Binary validation with filtering authority.
+    MINIMAL FIX: Native speaker acceptability check to reject multiple correct answers.
+
+    The validation procedure is a module constant leading the message;
+    the per-batch payload and counts trail it.
+    """
+    n = str(len(job_list))
+
+    # Construct validation input combining Stage 1 and Stage 2 data
+    validation_input = _build_validation_input(job_list, stage1_outputs, stage2_outputs)
+
+    user_msg = "".join([
+        _S3_VOCAB_INSTRUCTIONS,
+        _S3_INPUT_LEGEND,
+        "\n---\nVALIDATION INPUT (exactly ", n, " questions):\n",
+        _dumps_payload(validation_input),
+        "\n\nVERIFICATION: You must provide exactly ", n,
+        " validated distractor sets with exactly 3 selected distractors each.\n",
+    ])
+    return _S3_VOCAB_SYSTEM, user_msg
+
+
+# --------------------------------------------------------------------------
+# Fused Stage 2+3 (candidate generation + validation in one call)
+# --------------------------------------------------------------------------
+
+_S23_GRAMMAR_SYSTEM = """You are an expert ELT test designer and English grammar validator. For every grammar question you will generate candidate distractors, validate them yourself, and return the results in a single JSON response with a "validated" key."""
+
+_S23_VOCAB_SYSTEM = """You are an expert ELT test designer and English vocabulary validator. For every vocabulary question you will generate candidate distractors, validate them yourself, and return the results in a single JSON response with a "validated" key."""
+
+
+def _validation_procedure(instructions):
+    """The stage-3 validation procedure without the stand-alone TASK header
+    and output-format footer, for embedding in the fused prompt."""
+    body = instructions.split("MANDATORY OUTPUT FORMAT:", 1)[0]
+    return body.split("\n\n", 1)[1].rstrip()
+
+
+_S23_GRAMMAR_VALIDATION = _validation_procedure(_S3_GRAMMAR_INSTRUCTIONS)
+_S23_VOCAB_VALIDATION = _validation_procedure(_S3_VOCAB_INSTRUCTIONS)
+
+
+def _stage23_user_msg(n, payload, category, gen_instructions, validation_procedure):
+    return "".join([
+        "\nTASK: For ALL ", category, " questions listed at the end of this message, generate 5 candidate distractors per question (STEP ONE), then validate your own candidates and select the final three (STEP TWO).\n\n",
+        "STEP ONE - ", gen_instructions,
+        "\n\nSTEP TWO - VALIDATION: Apply the following procedure to the five candidates you generated in STEP ONE for each question; there is no separate validation input.\n\n",
+        validation_procedure,
+        "\n\nMANDATORY OUTPUT FORMAT: Return a JSON object matching the provided response schema, with a \"validated\" array of one entry per question: \"Item Number\" echoes the question, \"Candidate A\"-\"Candidate E\" hold your full step-one pool, \"Selected Distractor A\"-\"Selected Distractor C\" hold the three survivors, and \"Validation Notes\" briefly explains rejections.\n",
+        "\n---\nINPUT FROM STAGE 1 (Complete sentences with correct answers; exactly ", n, " questions):\n",
+        payload,
+        "\n\nVERIFICATION: You must return exactly ", n, " entries, each with 5 candidates and exactly 3 selected distractors.\n",
+    ])
+
+
+def create_sequential_batch_stage23_grammar_prompt(job_list, stage1_outputs):
+    """
+    FUSED STAGE TWO+THREE (GRAMMAR): candidate generation and validation in
+    one call, reusing the stage-2 generation instructions and the stage-3
+    validation procedure verbatim. Saves a full round-trip per batch over
+    running the stages separately.
+    """
+    n = str(len(job_list))
+    user_msg = _stage23_user_msg(
+        n,
+        _dumps_payload(_project_stage1(stage1_outputs)),
+        "GRAMMAR",
+        _S2_GRAMMAR_INSTRUCTIONS,
+        _S23_GRAMMAR_VALIDATION,
+    )
+    return _S23_GRAMMAR_SYSTEM, user_msg
+
+
+def create_sequential_batch_stage23_vocabulary_prompt(job_list, stage1_outputs):
+    """
+    FUSED STAGE TWO+THREE (VOCABULARY): candidate generation and validation
+    in one call, reusing the stage-2 generation instructions and the
+    stage-3 validation procedure verbatim. Saves a full round-trip per
+    batch over running the stages separately.
+    """
+    n = str(len(job_list))
+    user_msg = _stage23_user_msg(
+        n,
+        _dumps_payload(_project_stage1(stage1_outputs)),
+        "VOCABULARY",
+        _S2_VOCAB_INSTRUCTIONS,
+        _S23_VOCAB_VALIDATION,
+    )
+    return _S23_VOCAB_SYSTEM, user_msg
 
 
 # --------------------------------------------------------------------------
@@ -1169,9 +1640,6 @@ def create_sequential_stage1_prompt(job, example_banks):
     examples = get_few_shot_examples(job, example_banks)
     system_msg = "You are an expert ELT content creator. Output ONLY valid JSON."
     
-    raw_context = job.get('context', 'General')
-    main_topic = raw_context
-    
     constraint_text = ""
     if job['type'] == 'Grammar' and 'vs' in job.get('focus', '').lower():
         constraint_text = """
@@ -1186,7 +1654,7 @@ def create_sequential_stage1_prompt(job, example_banks):
     user_msg = f"""
 TASK: Generate a complete sentence containing the correct answer and an embedded context clue for a {job['cefr']} {job['type']} question.
 FOCUS: {job['focus']}
-TOPIC: {main_topic}
+TOPIC: {job.get('context', 'General')}
 
 {constraint_text}
 
@@ -1215,17 +1683,14 @@ REPLICATE THIS STYLE:
     return system_msg, user_msg
 
 
-def create_holistic_prompt(job, example_banks):
-    examples = get_few_shot_examples(job, example_banks)
-    system_msg = "You are an expert ELT content creator. Output ONLY valid JSON."
-    
-    raw_context = job.get('context', 'General')
-    main_topic = raw_context
-
-    user_msg = f"""
-TASK: Generate a {job['cefr']} {job['type']} question.
-FOCUS: {job['focus']}
-TOPIC: {main_topic}
+# Compiled once at import: the holistic builder runs once per job, so the
+# big instruction/skeleton text is a fixed template and each call is a
+# single format_map substitution instead of re-evaluating a multi-KB
+# f-string.
+_HOLISTIC_USER_TEMPLATE = """
+TASK: Generate a {cefr} {type} question.
+FOCUS: {focus}
+TOPIC: {topic}
 
 INSTRUCTIONS:
 1. **CONTEXT CLUE RULE:** Provide context that invalidates distractors.
@@ -1238,34 +1703,49 @@ INSTRUCTIONS:
 
 Output Format:
 {{
-  "Item Number": "{job['job_id']}",
-  "Assessment Focus": "{job['focus']}",
+  "Item Number": "{job_id}",
+  "Assessment Focus": "{focus}",
   "Question Prompt": "...",
   "Answer A": "...",
   "Answer B": "...",
   "Answer C": "...",
   "Answer D": "...",
   "Correct Answer": "...",
-  "CEFR rating": "{job['cefr']}",
-  "Category": "{job['type']}"
+  "CEFR rating": "{cefr}",
+  "Category": "{type}"
 }}
 
 REPLICATE THIS STYLE:
 {examples}
 """
+
+
+def create_holistic_prompt(job, example_banks):
+    examples = get_few_shot_examples(job, example_banks)
+    system_msg = "You are an expert ELT content creator. Output ONLY valid JSON."
+
+    user_msg = _HOLISTIC_USER_TEMPLATE.format_map({
+        "job_id": job['job_id'],
+        "cefr": job['cefr'],
+        "type": job['type'],
+        "focus": job['focus'],
+        "topic": job.get('context', 'General'),
+        "examples": examples,
+    })
     return system_msg, user_msg
 
 
-def create_options_prompt(job, example_banks):
-    system_msg = "You are an expert ELT test designer. Output ONLY valid JSON."
-    
-    raw_context = job.get('context', 'General')
-    main_topic = raw_context
+# Per-job segmented builders run once per question, so their system
+# strings and instruction bodies are module constants too and each call
+# is one format_map substitution (same pattern as the holistic template).
+_OPTIONS_SYSTEM = "You are an expert ELT test designer. Output ONLY valid JSON."
+_STEM_SYSTEM = "You are an expert ELT writer. Output ONLY valid JSON."
 
-    user_msg = f"""
-TASK: Generate 4 answer choices for a {job['cefr']} {job['type']} question.
-FOCUS: {job['focus']}
-TOPIC: {main_topic}
+# Like the batched builders, the static instruction text leads and the
+# per-job parameters sit at the tail, so every job shares one
+# byte-identical prefix for the provider's prompt cache.
+_OPTIONS_USER_TEMPLATE = """
+TASK: Generate 4 answer choices for the question specified at the end.
 
 RULES:
 1. **WORD LIMIT:** Each option max 3 words.
@@ -1282,39 +1762,150 @@ Output Format:
   "Answer D": "...",
   "Correct Answer": "A/B/C/D"
 }}
+
+---
+QUESTION SPECIFICATION:
+LEVEL: {cefr}
+TYPE: {type}
+FOCUS: {focus}
+TOPIC: {topic}
 """
-    return system_msg, user_msg
 
-
-def create_stem_prompt(job, options_json_string):
-    system_msg = "You are an expert ELT writer. Output ONLY valid JSON."
-    
-    raw_context = job.get('context', 'General')
-    
-    user_msg = f"""
-TASK: Write a question stem for these options.
-
-OPTIONS: {options_json_string}
+_STEM_USER_TEMPLATE = """
+TASK: Write a question stem for the options specified at the end.
 
 INSTRUCTIONS:
 1. **CONTEXT CLUE:** Provide context that invalidates ALL distractors.
 2. **VERBOSITY:** Max 1-2 sentences. No preambles.
 3. **METALANGUAGE:** Never use grammar terminology.
 4. **NO LEXICAL OVERLAP:** Don't repeat option words in stem.
-5. Write {job['cefr']} level sentence where ONLY correct answer fits.
+5. Write a sentence at the given CEFR level where ONLY the correct answer fits.
 
-Output Format:
+Output Format (echo Item Number, Assessment Focus, CEFR rating and
+Category from the specification below):
 {{
-  "Item Number": "{job['job_id']}",
-  "Assessment Focus": "{job['focus']}",
+  "Item Number": "...",
+  "Assessment Focus": "...",
   "Question Prompt": "...",
   "Answer A": "...",
   "Answer B": "...",
   "Answer C": "...",
   "Answer D": "...",
   "Correct Answer": "...",
-  "CEFR rating": "{job['cefr']}",
-  "Category": "{job['type']}"
+  "CEFR rating": "...",
+  "Category": "..."
 }}
+
+---
+ITEM NUMBER: {job_id}
+ASSESSMENT FOCUS: {focus}
+LEVEL: {cefr}
+CATEGORY: {type}
+OPTIONS: {options_json_string}
+"""
+
+
+def create_options_prompt(job, example_banks):
+    user_msg = _OPTIONS_USER_TEMPLATE.format_map({
+        "cefr": job['cefr'],
+        "type": job['type'],
+        "focus": job['focus'],
+        "topic": job.get('context', 'General'),
+    })
+    return _OPTIONS_SYSTEM, user_msg
+
+
+def create_options_batch_prompt(job_list, example_banks):
+    """
+    Batched version of create_options_prompt: generates answer choices for
+    ALL jobs in one call instead of one call per job, so the segmented
+    strategy pays the network round-trip and static instructions once per
+    batch rather than once per question.
+    """
+    examples = get_few_shot_examples(job_list[0], example_banks) if job_list else ""
+    n = str(len(job_list))
+    system_msg = _OPTIONS_SYSTEM
+
+    job_specs = [
+        {
+            "job_id": job['job_id'],
+            "cefr": _intern(str(job['cefr'])),
+            "type": _intern(job['type']),
+            "focus": _intern(job['focus']),
+            "topic": job.get('context', 'General')
+        }
+        for job in job_list
+    ]
+
+    user_msg = f"""
+TASK: Generate 4 answer choices for EACH of the {n} questions specified below.
+
+QUESTION SPECIFICATIONS (one option set for each, in this order):
+{_dumps_payload(job_specs)}
+
+RULES:
+1. **WORD LIMIT:** Each option max 3 words.
+2. **NO LEXICAL OVERLAP:** Don't use test word or root in options.
+3. Provide 4 parallel options (A, B, C, D) per question.
+4. Indicate correct answer.
+5. Distractors should be plausible errors for CEFR level.
+
+MANDATORY OUTPUT FORMAT: Return a JSON object matching the provided response schema, with an "options" array of exactly {n} option sets in input order ("Item Number" echoes the job_id, "Correct Answer" is A/B/C/D).
+
+VERIFICATION: You must return exactly {n} option sets.
+
+REPLICATE THIS STYLE:
+{examples}
+"""
+    return system_msg, user_msg
+
+
+def create_stem_batch_prompt(job_list, options_list):
+    """
+    Batched version of create_stem_prompt: writes question stems for ALL
+    option sets in one call. options_list holds the parsed option dicts in
+    job order, as returned by the batched options call.
+    """
+    n = str(len(job_list))
+    system_msg = _STEM_SYSTEM
+
+    stem_specs = [
+        {
+            "job_id": job['job_id'],
+            "cefr": _intern(str(job['cefr'])),
+            "type": _intern(job['type']),
+            "focus": _intern(job['focus']),
+            "options": options
+        }
+        for job, options in zip(job_list, options_list)
+    ]
+
+    user_msg = f"""
+TASK: Write a question stem for EACH of the {n} option sets below.
+
+INPUT (one stem per entry, in this order):
+{_dumps_payload(stem_specs)}
+
+INSTRUCTIONS:
+1. **CONTEXT CLUE:** Provide context that invalidates ALL distractors.
+2. **VERBOSITY:** Max 1-2 sentences. No preambles.
+3. **METALANGUAGE:** Never use grammar terminology.
+4. **NO LEXICAL OVERLAP:** Don't repeat option words in stem.
+5. Write a sentence at the given CEFR level where ONLY the correct answer fits.
+
+MANDATORY OUTPUT FORMAT: Return a JSON object matching the provided response schema, with a "questions" array of exactly {n} full question objects in input order ("Item Number" echoes the job_id).
+
+VERIFICATION: You must return exactly {n} question objects.
 """
     return system_msg, user_msg
+
+
+def create_stem_prompt(job, options_json_string):
+    user_msg = _STEM_USER_TEMPLATE.format_map({
+        "job_id": job['job_id'],
+        "cefr": job['cefr'],
+        "type": job['type'],
+        "focus": job['focus'],
+        "options_json_string": options_json_string,
+    })
+    return _STEM_SYSTEM, user_msg
@@ -0,0 +1,54 @@
+import hashlib
+import shelve
+
+# On-disk cache for full LLM responses, layered above provider prompt
+# caching. Vocabulary lists are re-used heavily across course levels, so a
+# repeat run with the same list, CEFR, and question form can skip the
+# stage-1 call entirely.
+#
+# Keys hash the complete prompt plus model name, so anything that changes
+# the request (targets, definitions, form constraint, instruction text)
+# misses cleanly. Caveat: responses are sampled at temperature 0.9, so a
+# hit replays one earlier sample rather than drawing a fresh one — fine
+# for stage-1 sentence generation, where stable output per input is
+# actually desirable.
+
+CACHE_PATH = ".response_cache"
+
+
+def make_key(messages, model, seed=None):
+    """Stable cache key for a (system, user, model) request triple.
+
+    Pass the run's RNG seed when prompt content depends on seeded sampling,
+    so runs with different seeds never replay each other's responses.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(messages[0].encode())
+    digest.update(b"\x00")
+    digest.update(messages[1].encode())
+    digest.update(b"\x00")
+    digest.update(model.encode())
+    if seed is not None:
+        digest.update(b"\x00")
+        digest.update(str(seed).encode())
+    return digest.hexdigest()
+
+
+def get(key):
+    """Returns the cached response text for key, or None."""
+    try:
+        with shelve.open(CACHE_PATH) as cache:
+            return cache.get(key)
+    except OSError:
+        return None
+
+
+def set(key, response):
+    """Stores a response under key. Error responses are never cached."""
+    if not response or response.startswith("Error:"):
+        return
+    try:
+        with shelve.open(CACHE_PATH) as cache:
+            cache[key] = response
+    except OSError:
+        pass
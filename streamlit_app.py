@@ -1,12 +1,15 @@
 import streamlit as st
 import pandas as pd
-import random
-import json
+import collections
+import functools
+import hashlib
+import re
 import time
-import test_planner
-import prompt_engineer
-import llm_service
-import output_formatter
+
+# The pipeline modules (and the openai / numpy imports behind them) are
+# pulled in lazily inside the generate handlers: tabs 2 and 3 never need
+# them, so first paint skips that import cost. Python caches modules, so
+# every click after the first is free.
 
 # -----------------------------------------------------------------
 # App Configuration & Styling
@@ -24,8 +27,10 @@ except Exception:
     st.error("❌ OpenAI API Key not found in Secrets. Please add it to your Streamlit Cloud settings.")
     st.stop()
     
-# Custom CSS (same as original)
-st.markdown("""
+# Custom CSS (same as original). Built once as a module constant; the
+# st.markdown call itself must run every rerun or Streamlit drops the
+# style element from the page.
+_APP_CSS = """
 <style>
     .stApp {
         background: linear-gradient(135deg, #191970 0%, #121245 50%, #191970 100%);
@@ -165,172 +170,325 @@ st.markdown("""
         margin-bottom: 10px !important;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(_APP_CSS, unsafe_allow_html=True)
+
+# Per-stage sub-batches larger than this are sliced into parallel calls:
+# past ~20 questions the long single-response decode dominates wall time,
+# while each slice reuses the same cached static prefix for free.
+STAGE_CHUNK_SIZE = 20
 
 # -----------------------------------------------------------------
 # Data Loader
 # -----------------------------------------------------------------
-@st.cache_data
+def _compact_bank(df):
+    """Converts low-cardinality text columns (CEFR levels, focus labels,
+    categories) to categoricals: a fraction of the memory and faster
+    column scans when the banks grow."""
+    for col in df.columns:
+        if df[col].dtype == object and df[col].nunique() / max(len(df), 1) < 0.5:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _load_bank(name):
+    """Loads one example bank, preferring the Parquet file produced by
+    convert_banks.py (columnar binary read, GSE column already dropped)."""
+    try:
+        df = pd.read_parquet(f"{name}.parquet", engine="pyarrow")
+    except (FileNotFoundError, ImportError, ValueError):
+        df = pd.read_csv(f"{name}.csv")
+        if "GSE Score" in df.columns:
+            df = df.drop(columns=["GSE Score"])
+    return _compact_bank(df)
+
+
+# cache_resource rather than cache_data: the banks are read-only, so
+# storing them by reference skips the per-rerun hash/copy, and a stable
+# object identity keeps the id()-keyed example-index cache warm.
+@st.cache_resource
 def load_example_banks():
     try:
-        df_g = pd.read_csv("grammar_bank.csv")
-        df_v = pd.read_csv("vocab_bank.csv")
-        
-        if "GSE Score" in df_g.columns:
-            df_g = df_g.drop(columns=["GSE Score"])
-        if "GSE Score" in df_v.columns:
-            df_v = df_v.drop(columns=["GSE Score"])
-            
-        return {"grammar": df_g, "vocab": df_v}
+        return {"grammar": _load_bank("grammar_bank"), "vocab": _load_bank("vocab_bank")}
     except FileNotFoundError:
         st.error("Error: Example bank CSVs not found.")
         return None
     except Exception as e:
-        st.error(f"Error loading CSVs: {e}")
+        st.error(f"Error loading example banks: {e}")
         return None
 
 # -----------------------------------------------------------------
 # Helper Functions
 # -----------------------------------------------------------------
-@st.cache_data
+# Static lookup tables for the UI selectors. Plain dict lookups — no
+# branching chain to walk and nothing for st.cache_data to hash.
+FOCUS_OPTIONS = {
+    ("Grammar", "A1"): (
+        "Present Simple ('be'/'have')",
+        "Prepositions of Time ('on'/'in'/'at')",
+        "Prepositions of Place ('on'/'in'/'at')",
+        "Possessive Adjectives",
+        "Articles (a/an/the)",
+        "this/that/these/those",
+        "Plurals (regular/irregular)",
+        "Modals ('can'/'can't' for ability)"
+    ),
+    ("Grammar", "A2"): (
+        "Past Simple (regular/irregular)",
+        "Countable/Uncountable Nouns (some/any)",
+        "Comparatives & Superlatives",
+        "Present Continuous",
+        "Future ('going to' vs. 'will')",
+        "like vs. would like",
+        "Adverbs of Frequency",
+        "Modals ('should'/'have to' for advice/obligation)"
+    ),
+    ("Grammar", "B1"): (
+        "Past Simple vs. Present Perfect",
+        "Conditionals (Type 1 & 2)",
+        "Modals of Obligation (must/have to/should)",
+        "Reported Speech (basic statements/questions)",
+        "Passive Voice (simple present/past)",
+        "Gerunds & Infinitives (basic)",
+        "Future Continuous",
+        "Common Phrasal Verbs"
+    ),
+    ("Grammar", "B2"): (
+        "Conditionals (Type 3 & Mixed)",
+        "Passive (Causative - have/get something done)",
+        "Passive (all tenses)",
+        "Modals of Speculation (past/present)",
+        "Relative Clauses (defining/non-defining)",
+        "Reported Speech (advanced - suggest, advise)",
+        "Future Perfect",
+        "Gerunds & Infinitives (after specific verbs/prepositions)"
+    ),
+    ("Grammar", "C1"): (
+        "Inversion (e.g., 'Not only...')",
+        "Conditionals (Advanced Mixed, implied)",
+        "Passive (Advanced Forms, impersonal)",
+        "Modals (subtle meaning, nuance)",
+        "Future (Future Perfect Continuous)",
+        "Cleft Sentences (e.g., 'What I need is...')",
+        "Ellipsis",
+        "Participle Clauses (Perfect/Past)",
+        "Subjunctive Mood"
+    ),
+    ("Vocabulary", "A1"): (
+        "Category Membership",
+        "Basic Antonym",
+        "Meaning-in-Sentence (Context Clue)",
+        "Basic Collocation (e.g., 'have breakfast')"
+    ),
+    ("Vocabulary", "A2"): (
+        "Meaning-in-Sentence (Context Clue)",
+        "Collocation (Verb+Noun)",
+        "Word Form (noun/verb/adj)",
+        "Functional Usage (e.g., 'What for?')",
+        "Basic Synonym"
+    ),
+    ("Vocabulary", "B1"): (
+        "Meaning-in-Sentence (Inference)",
+        "Collocation (Adverb+Adj)",
+        "Word Form (Affixes - un, re, able)",
+        "Functional Usage (e.g., 'I'd rather...')",
+        "Phrasal Verbs (common, separable/inseparable)"
+    ),
+    ("Vocabulary", "B2"): (
+        "Synonym (subtle difference)",
+        "Collocation (idiomatic, e.g., 'take into account')",
+        "Functional Usage (formal/informal register)",
+        "Phrasal Verbs (less common)",
+        "Word Form (noun/adj suffixes -tion, -ive)"
+    ),
+    ("Vocabulary", "C1"): (
+        "Synonym (high-level, low-frequency)",
+        "Idiomatic Expressions",
+        "Functional Usage (advanced nuance, persuasion)",
+        "Collocation (academic, e.g., 'conduct research')",
+        "Advanced Phrasal Verbs & Idioms",
+        "Hedging Language",
+        "Binomials",
+        "Discourse Markers (Cohesion)"
+    )
+}
+
+TOPIC_SUGGESTIONS = {
+    "A1": ("Personal Information", "Family", "Food & Drink", "My Home", "Days & Times"),
+    "A2": ("Daily Routines", "Past Holidays", "Shopping", "Friends & Hobbies", "My Town", "Jobs"),
+    "B1": ("Work & Jobs", "The Environment", "Travel & Tourism", "Technology", "Health & Fitness", "Education"),
+    "B2": ("Media & News", "Crime & Society", "The Future", "Education Systems", "Business & Finance", "Global Issues"),
+    "C1": ("Philosophy & Ethics", "Scientific Research", "Global Politics", "Art & Literature", "Psychology")
+}
+
+
 def get_focus_options(q_type, cefr):
-    if q_type == "Grammar":
-        if cefr == "A1":
-            return [
-                "Present Simple ('be'/'have')", 
-                "Prepositions of Time ('on'/'in'/'at')", 
-                "Prepositions of Place ('on'/'in'/'at')",
-                "Possessive Adjectives", 
-                "Articles (a/an/the)",
-                "this/that/these/those",
-                "Plurals (regular/irregular)",
-                "Modals ('can'/'can't' for ability)"
-            ]
-        elif cefr == "A2":
-            return [
-                "Past Simple (regular/irregular)", 
-                "Countable/Uncountable Nouns (some/any)", 
-                "Comparatives & Superlatives", 
-                "Present Continuous",
-                "Future ('going to' vs. 'will')",
-                "like vs. would like",
-                "Adverbs of Frequency",
-                "Modals ('should'/'have to' for advice/obligation)"
-            ]
-        elif cefr == "B1":
-            return [
-                "Past Simple vs. Present Perfect", 
-                "Conditionals (Type 1 & 2)", 
-                "Modals of Obligation (must/have to/should)", 
-                "Reported Speech (basic statements/questions)", 
-                "Passive Voice (simple present/past)",
-                "Gerunds & Infinitives (basic)",
-                "Future Continuous",
-                "Common Phrasal Verbs"
-            ]
-        elif cefr == "B2":
-            return [
-                "Conditionals (Type 3 & Mixed)", 
-                "Passive (Causative - have/get something done)",
-                "Passive (all tenses)",
-                "Modals of Speculation (past/present)", 
-                "Relative Clauses (defining/non-defining)", 
-                "Reported Speech (advanced - suggest, advise)",
-                "Future Perfect",
-                "Gerunds & Infinitives (after specific verbs/prepositions)"
-            ]
-        elif cefr == "C1":
-            return [
-                "Inversion (e.g., 'Not only...')", 
-                "Conditionals (Advanced Mixed, implied)", 
-                "Passive (Advanced Forms, impersonal)", 
-                "Modals (subtle meaning, nuance)", 
-                "Future (Future Perfect Continuous)",
-                "Cleft Sentences (e.g., 'What I need is...')",
-                "Ellipsis",
-                "Participle Clauses (Perfect/Past)",
-                "Subjunctive Mood"
-            ]
-    
-    if q_type == "Vocabulary":
-        if cefr == "A1":
-            return [
-                "Category Membership", 
-                "Basic Antonym", 
-                "Meaning-in-Sentence (Context Clue)", 
-                "Basic Collocation (e.g., 'have breakfast')"
-            ]
-        elif cefr == "A2":
-            return [
-                "Meaning-in-Sentence (Context Clue)", 
-                "Collocation (Verb+Noun)", 
-                "Word Form (noun/verb/adj)", 
-                "Functional Usage (e.g., 'What for?')", 
-                "Basic Synonym"
-            ]
-        elif cefr == "B1":
-            return [
-                "Meaning-in-Sentence (Inference)", 
-                "Collocation (Adverb+Adj)", 
-                "Word Form (Affixes - un, re, able)", 
-                "Functional Usage (e.g., 'I'd rather...')", 
-                "Phrasal Verbs (common, separable/inseparable)"
-            ]
-        elif cefr == "B2":
-            return [
-                "Synonym (subtle difference)", 
-                "Collocation (idiomatic, e.g., 'take into account')", 
-                "Functional Usage (formal/informal register)", 
-                "Phrasal Verbs (less common)", 
-                "Word Form (noun/adj suffixes -tion, -ive)"
-            ]
-        elif cefr == "C1":
-            return [
-                "Synonym (high-level, low-frequency)", 
-                "Idiomatic Expressions", 
-                "Functional Usage (advanced nuance, persuasion)", 
-                "Collocation (academic, e.g., 'conduct research')",
-                "Advanced Phrasal Verbs & Idioms",
-                "Hedging Language",
-                "Binomials",
-                "Discourse Markers (Cohesion)"
-            ]
-    
-    return ["No options loaded for this level"]
+    return FOCUS_OPTIONS.get((q_type, cefr), ("No options loaded for this level",))
+
 
-@st.cache_data
 def get_topic_suggestions(cefr):
-    if cefr == "A1":
-        return ["Personal Information", "Family", "Food & Drink", "My Home", "Days & Times"]
-    elif cefr == "A2":
-        return ["Daily Routines", "Past Holidays", "Shopping", "Friends & Hobbies", "My Town", "Jobs"]
-    elif cefr == "B1":
-        return ["Work & Jobs", "The Environment", "Travel & Tourism", "Technology", "Health & Fitness", "Education"]
-    elif cefr == "B2":
-        return ["Media & News", "Crime & Society", "The Future", "Education Systems", "Business & Finance", "Global Issues"]
-    elif cefr == "C1":
-        return ["Philosophy & Ethics", "Scientific Research", "Global Politics", "Art & Literature", "Psychology"]
-    
-    return ["No topics loaded for this level"]
-
-# Initialize session state
-if 'last_batch' not in st.session_state:
-    st.session_state.last_batch = None
-if 'last_batch_strategy' not in st.session_state:
-    st.session_state.last_batch_strategy = None
-if 'sequential_stage1_data' not in st.session_state:
-    st.session_state.sequential_stage1_data = None
-if 'sequential_stage2_data' not in st.session_state:
-    st.session_state.sequential_stage2_data = None
-if 'sequential_stage3_data' not in st.session_state:
-    st.session_state.sequential_stage3_data = None
-if 'debug_logs' not in st.session_state:
-    st.session_state.debug_logs = []
-# Tab 4 vocabulary upload session state
-if 'uploaded_vocab_df' not in st.session_state:
-    st.session_state.uploaded_vocab_df = None
-if 'last_uploaded_file_id' not in st.session_state:
-    st.session_state.last_uploaded_file_id = None
+    return TOPIC_SUGGESTIONS.get(cefr, ("No topics loaded for this level",))
+
+class DebugLog:
+    """Bounded debug log with a lazily cached joined view: appends are
+    O(1), and the Debug Logs tab re-joins only when something was added
+    since the last render instead of on every rerun."""
+
+    def __init__(self, maxlen=500):
+        self._lines = collections.deque(maxlen=maxlen)
+        self._joined = None
+
+    def append(self, line):
+        self._lines.append(line)
+        self._joined = None
+
+    def clear(self):
+        self._lines.clear()
+        self._joined = None
+
+    def text(self):
+        if self._joined is None:
+            self._joined = "\n".join(str(line) for line in self._lines)
+        return self._joined
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __bool__(self):
+        return bool(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines)
+
+
+@st.cache_data(max_entries=6)
+def stage_rows_frame(rows):
+    """Materializes a stage's raw row list into a DataFrame for the
+    Refinement Workshop, cached so tab-2 reruns reuse the frame."""
+    return pd.DataFrame(rows)
+
+
+@st.cache_data(max_entries=8)
+def df_to_csv_bytes(df):
+    """CSV-encodes a DataFrame for download. Cached so reruns that leave
+    the frame unchanged (every widget interaction) skip re-serializing."""
+    return df.to_csv(index=False).encode('utf-8')
+
+
+# Final output column order, shared by every strategy.
+QUESTION_COLUMNS = (
+    "Item Number", "Assessment Focus", "Question Prompt",
+    "Answer A", "Answer B", "Answer C", "Answer D",
+    "Correct Answer", "CEFR rating", "Category"
+)
+
+
+def questions_frame(questions):
+    """Builds the final DataFrame column-by-column (one list per column)
+    instead of handing pandas a list of row dicts to infer — no per-cell
+    schema inference, and the low-cardinality columns go in as
+    categoricals."""
+    cols = {name: [q.get(name, "") for q in questions] for name in QUESTION_COLUMNS}
+    df = pd.DataFrame(cols, copy=False)
+    for name in ("Correct Answer", "CEFR rating", "Category"):
+        df[name] = df[name].astype("category")
+    return df
+
+
+@functools.lru_cache(maxsize=256)
+def _answer_pattern(correct_answer):
+    return re.compile(rf"\b{re.escape(correct_answer)}\b")
+
+
+def blank_out_answer(complete_sentence, correct_answer):
+    """
+    Replaces the first whole-word occurrence of the correct answer with the
+    blank. A plain str.replace would also hit substrings ("art" inside
+    "start") and every later occurrence; the word boundary and count=1 keep
+    the blank on the answer itself. Falls back to str.replace when the
+    boundary match finds nothing (e.g. answers ending in punctuation).
+    """
+    blanked, n = _answer_pattern(correct_answer).subn("____", complete_sentence, count=1)
+    if n:
+        return blanked
+    return complete_sentence.replace(correct_answer, "____", 1)
+
+
+@st.fragment
+def render_stage_editor(title, rows, editor_key):
+    """One pipeline-stage editor, isolated in a fragment: edits rerun only
+    this block instead of the whole script (tab 1 widgets, bank loading,
+    the other editors)."""
+    st.markdown(title)
+    if rows is not None:
+        st.data_editor(
+            stage_rows_frame(rows),
+            use_container_width=True,
+            num_rows="dynamic",
+            key=editor_key
+        )
+
+
+@st.fragment
+def render_batch_editor(working_batch, editor_key, label, file_name, download_key):
+    """Editable batch view plus its download button, fragment-scoped so
+    per-keystroke reruns stay local to the editor."""
+    edited = st.data_editor(
+        working_batch,
+        use_container_width=True,
+        num_rows="dynamic",
+        key=editor_key
+    )
+    st.download_button(
+        label=label,
+        data=df_to_csv_bytes(edited),
+        file_name=file_name,
+        mime="text/csv",
+        key=download_key
+    )
+
+
+def dedupe_stage1_rows(stage1_rows):
+    """
+    Stage-1 rows sharing the same (Assessment Focus, Complete Sentence,
+    Correct Answer) would receive identical distractor sets from Stages 2
+    and 3, so later stages only need one representative per key. Returns
+    the positions of first occurrences plus a per-row map into that
+    unique list for fanning results back out.
+    """
+    unique_positions = []
+    row_to_unique = []
+    seen = {}
+    for pos, row in enumerate(stage1_rows):
+        fingerprint = "|".join((
+            str(row.get("Assessment Focus", "")),
+            str(row.get("Complete Sentence", "")),
+            str(row.get("Correct Answer", ""))
+        ))
+        key = hashlib.blake2b(fingerprint.encode(), digest_size=8).digest()
+        uniq = seen.get(key)
+        if uniq is None:
+            uniq = seen[key] = len(unique_positions)
+            unique_positions.append(pos)
+        row_to_unique.append(uniq)
+    return unique_positions, row_to_unique
+
+# Initialize session state in one pass (includes the tab-4 upload keys).
+# The dict literal is rebuilt each rerun, so the DebugLog stored on a
+# session's first run is never shared with another session.
+_SESSION_DEFAULTS = {
+    'last_batch': None,
+    'last_batch_strategy': None,
+    'sequential_stage1_data': None,
+    'sequential_stage2_data': None,
+    'sequential_stage3_data': None,
+    'debug_logs': DebugLog(),
+    'uploaded_vocab_df': None,
+    'last_uploaded_file_id': None,
+}
+for _key, _default in _SESSION_DEFAULTS.items():
+    st.session_state.setdefault(_key, _default)
 # -----------------------------------------------------------------
 # Main UI
 # -----------------------------------------------------------------
@@ -362,23 +520,11 @@ with tab1:
     st.header("Batch Generation Settings")
 
     col1, col2 = st.columns(2)
-    with col1:
-        q_type = st.selectbox(
-            "Question Type",
-            ("Grammar", "Vocabulary"),
-            key="q_type"
-        )
-        
-        cefr = st.session_state.get('cefr', 'A1') 
-        q_type_key = st.session_state.get('q_type', 'Grammar')
-        
-        focus_options = get_focus_options(q_type_key, cefr)
-        selected_focus = st.multiselect(
-            "Assessment Focus (Select one or more)",
-            focus_options,
-            key="assessment_focus"
-        )
 
+    # col2 renders first so the CEFR selectbox has bound its value before
+    # col1 derives focus_options from it — otherwise the focus list lags
+    # the level change by one rerun. The layout is unaffected: columns are
+    # positional, not ordered by execution.
     with col2:
         cefr = st.selectbox(
             "CEFR Target",
@@ -399,6 +545,32 @@ with tab1:
             index=2,
             key="batch_size"
         )
+
+        use_batch_api = st.checkbox(
+            "Batch API mode (Holistic only)",
+            key="use_batch_api",
+            help="Submits the jobs through the OpenAI Batch API: roughly half the cost and a separate rate-limit pool, with results ready within 24 hours. Retrieve them below once the batch completes."
+        )
+
+        show_raw_responses = st.checkbox(
+            "Show raw LLM responses",
+            key="show_raw_responses",
+            help="Renders each stage's full raw response in an expander. The responses can run tens of kilobytes, so leave this off unless you are debugging parsing; the execution log in the Debug Logs tab stays on either way."
+        )
+
+    with col1:
+        q_type = st.selectbox(
+            "Question Type",
+            ("Grammar", "Vocabulary"),
+            key="q_type"
+        )
+
+        focus_options = get_focus_options(q_type, cefr)
+        selected_focus = st.multiselect(
+            "Assessment Focus (Select one or more)",
+            focus_options,
+            key="assessment_focus"
+        )
     
     st.divider()
 
@@ -408,18 +580,22 @@ with tab1:
         placeholder="e.g., 'A business email' or 'A story about a holiday'"
     )
     
-    current_cefr = st.session_state.get('cefr', 'A1')
-    with st.expander(f"View suggested topics for {current_cefr}..."):
-        suggestions = get_topic_suggestions(current_cefr)
+    with st.expander(f"View suggested topics for {cefr}..."):
+        suggestions = get_topic_suggestions(cefr)
         st.info(" - " + "\n - ".join(suggestions))
     
     st.divider()
 
     if st.button("Generate Batch", type="primary", use_container_width=True):
+        import llm_service
+        import output_formatter
+        import prompt_engineer
+        import test_planner
+
         if not selected_focus:
             st.error("Please select at least one 'Assessment Focus'.")
         else:
-            st.session_state.debug_logs = []
+            st.session_state.debug_logs.clear()
             
             with st.spinner(f"Generating {batch_size} questions..."):
                 try:
@@ -462,102 +638,303 @@ with tab1:
                                     status_text.text(f"Stage 1: Generating stems with context clues...")
                                     st.session_state.debug_logs.append("\n--- STAGE 1: SENTENCE GENERATION ---")
                                     
-                                    sys_msg_1, user_msg_1 = prompt_engineer.create_sequential_batch_stage1_prompt(job_list, example_banks)
-                                    raw_stage1 = llm_service.call_llm([sys_msg_1, user_msg_1], user_api_key)
-                                    
-                                    with st.expander("🔍 DEBUG: Stage 1 Raw Response", expanded=False):
-                                        st.text_area("Complete Raw LLM Response", raw_stage1, height=300, key="debug_stage1_raw")
-                                    
-                                    stage1_data, stage1_error = output_formatter.parse_response(raw_stage1)
-                                    if stage1_error:
-                                        st.error(f"Stage 1 failed: {stage1_error}")
-                                        break
-                                    
-                                    if isinstance(stage1_data, dict) and "questions" in stage1_data:
-                                        stage1_data_list = stage1_data["questions"]
+                                    # A deterministic job order makes identical job sets
+                                    # serialize into byte-identical prompts across runs,
+                                    # maximizing provider cache-prefix hits. The original
+                                    # order is restored after final assembly.
+                                    original_order = {str(job['job_id']): k for k, job in enumerate(job_list)}
+                                    job_list = sorted(job_list, key=prompt_engineer.job_sort_key)
+
+                                    # Classify the batch once; the stage-1 builder and the
+                                    # stage-2 partition both read these precomputed masks.
+                                    job_classes = prompt_engineer.classify_jobs(job_list)
+
+                                    stage1_grammar_idx = [int(i) for i in job_classes["grammar_idx"]]
+                                    stage1_vocab_idx = [int(i) for i in job_classes["vocab_idx"]]
+
+                                    # Each category's positions, sliced into size-capped
+                                    # chunks so oversize batches decode concurrently instead
+                                    # of in one long single-response call.
+                                    stage1_groups = [
+                                        positions[i:i + STAGE_CHUNK_SIZE]
+                                        for positions in (stage1_grammar_idx, stage1_vocab_idx)
+                                        for i in range(0, len(positions), STAGE_CHUNK_SIZE)
+                                    ]
+
+                                    stage1_failed = set()
+
+                                    if len(stage1_groups) > 1:
+                                        # Mixed or oversize batch: one stage-1 call per group,
+                                        # fired in parallel. Each prompt carries only its own
+                                        # category's constraint block, and every group reuses
+                                        # the same stable cached prefix.
+                                        status_text.text(
+                                            f"Stage 1: Generating {len(stage1_grammar_idx)} grammar and {len(stage1_vocab_idx)} vocabulary stems across {len(stage1_groups)} parallel calls..."
+                                        )
+                                        st.session_state.debug_logs.append(
+                                            f"Stage 1 split: {len(stage1_grammar_idx)} grammar / {len(stage1_vocab_idx)} vocabulary in {len(stage1_groups)} calls"
+                                        )
+                                        stage1_branches = [
+                                            (positions, prompt_engineer.create_sequential_batch_stage1_prompt(
+                                                [job_list[i] for i in positions], example_banks
+                                            ))
+                                            for positions in stage1_groups
+                                        ]
+                                        raw_stage1_list = llm_service.call_llm_parallel(
+                                            [[sys_msg, user_msg] for _, (sys_msg, user_msg) in stage1_branches],
+                                            user_api_key,
+                                            response_schemas=[
+                                                prompt_engineer.stage1_response_schema(len(positions))
+                                                for positions, _ in stage1_branches
+                                            ],
+                                            on_progress=lambda done, total: status_text.text(
+                                                f"Stage 1: {done}/{total} sub-batches complete..."
+                                            )
+                                        )
+                                        raw_stage1 = "\n\n".join(raw_stage1_list)
+
+                                        if show_raw_responses:
+                                            with st.expander("🔍 DEBUG: Stage 1 Raw Response", expanded=False):
+                                                st.text_area("Complete Raw LLM Response", raw_stage1, height=300, key="debug_stage1_raw")
+
+                                        stage1_data_list = [{} for _ in job_list]
+                                        for (positions, (sys_msg, user_msg)), raw_branch in zip(stage1_branches, raw_stage1_list):
+                                            branch_data, branch_error = output_formatter.parse_response(raw_branch)
+                                            if branch_error:
+                                                # One repair attempt before giving the branch
+                                                # up, same as the fused stage below.
+                                                st.session_state.debug_logs.append(
+                                                    f"Stage 1 branch parse failed ({branch_error}); retrying once"
+                                                )
+                                                repair_msg = (
+                                                    user_msg
+                                                    + "\n\nYour previous response was not valid JSON ("
+                                                    + str(branch_error)
+                                                    + "). Reply with valid JSON only."
+                                                )
+                                                raw_branch = llm_service.call_llm(
+                                                    [sys_msg, repair_msg], user_api_key,
+                                                    response_schema=prompt_engineer.stage1_response_schema(len(positions))
+                                                )
+                                                branch_data, branch_error = output_formatter.parse_response(raw_branch)
+
+                                            branch_list = None
+                                            if not branch_error:
+                                                if isinstance(branch_data, dict) and "questions" in branch_data:
+                                                    branch_list = branch_data["questions"]
+                                                else:
+                                                    branch_list, branch_error = output_formatter.extract_array_from_response(branch_data)
+
+                                            if branch_error:
+                                                # Keep the other branches' stems: flag these
+                                                # jobs and carry the rest into Stage 2+3.
+                                                st.warning(f"Stage 1 failed for {len(positions)} questions: {branch_error}")
+                                                stage1_failed.update(positions)
+                                                continue
+
+                                            for pos, question in zip(positions, branch_list):
+                                                stage1_data_list[pos] = question
+
+                                        if stage1_failed and len(stage1_failed) == len(job_list):
+                                            st.error("Stage 1 failed for every question in the batch.")
+                                            break
                                     else:
-                                        stage1_data_list, extract_error = output_formatter.extract_array_from_response(stage1_data)
-                                        if extract_error:
-                                            st.error(f"Stage 1 extraction failed: {extract_error}")
+                                        sys_msg_1, user_msg_1 = prompt_engineer.create_sequential_batch_stage1_prompt(job_list, example_banks, job_classes)
+
+                                        # Stream the Stage 1 response so the status line tracks
+                                        # questions as they complete instead of going silent for
+                                        # the whole batch.
+                                        stage1_progress = output_formatter.JSONArrayProgress()
+
+                                        def on_stage1_delta(delta):
+                                            done = stage1_progress.feed(delta)
+                                            if done:
+                                                status_text.text(f"Stage 1: Generated {min(done, len(job_list))} of {len(job_list)} stems...")
+
+                                        raw_stage1 = llm_service.call_llm_stream(
+                                            [sys_msg_1, user_msg_1], user_api_key,
+                                            response_schema=prompt_engineer.stage1_response_schema(len(job_list)),
+                                            on_delta=on_stage1_delta
+                                        )
+
+                                        if show_raw_responses:
+                                            with st.expander("🔍 DEBUG: Stage 1 Raw Response", expanded=False):
+                                                st.text_area("Complete Raw LLM Response", raw_stage1, height=300, key="debug_stage1_raw")
+
+                                        stage1_data, stage1_error = output_formatter.parse_response(raw_stage1)
+                                        if stage1_error:
+                                            st.error(f"Stage 1 failed: {stage1_error}")
                                             break
+
+                                        if isinstance(stage1_data, dict) and "questions" in stage1_data:
+                                            stage1_data_list = stage1_data["questions"]
+                                        else:
+                                            stage1_data_list, extract_error = output_formatter.extract_array_from_response(stage1_data)
+                                            if extract_error:
+                                                st.error(f"Stage 1 extraction failed: {extract_error}")
+                                                break
                                     
                                     st.session_state.debug_logs.append(f"Stage 1: Generated {len(stage1_data_list)} sentences")
-                                    
-                                    # ===== STAGE 2: GENERATE CANDIDATES =====
-                                    status_text.text(f"Stage 2: Generating candidate distractors...")
-                                    st.session_state.debug_logs.append("\n--- STAGE 2: CANDIDATE GENERATION ---")
-                                    
+
+                                    # Duplicate stage-1 rows would get identical distractor
+                                    # sets downstream, so stages 2 and 3 only process unique
+                                    # rows and results are fanned back out afterwards.
+                                    unique_positions, stage1_dup_map = dedupe_stage1_rows(stage1_data_list)
+                                    if len(unique_positions) < len(stage1_data_list):
+                                        st.session_state.debug_logs.append(
+                                            f"Deduplication: {len(stage1_data_list)} rows -> {len(unique_positions)} unique"
+                                        )
+
+                                    # ===== STAGE 2+3: CANDIDATES + VALIDATION (FUSED) =====
+                                    # Candidate generation and validation are strictly
+                                    # serial per question, so both run inside one fused
+                                    # call per category: one round-trip instead of two.
+                                    status_text.text("Stage 2+3: Generating and validating distractors...")
+                                    st.session_state.debug_logs.append("\n--- STAGE 2+3: CANDIDATES + VALIDATION (FUSED) ---")
+
                                     question_type = job_list[0]['type']
                                     st.session_state.debug_logs.append(f"Question type: {question_type}")
-                                    
-                                    if question_type == 'Grammar':
-                                        st.session_state.debug_logs.append("Using grammar candidate generation")
-                                        sys_msg_2, user_msg_2 = prompt_engineer.create_sequential_batch_stage2_grammar_prompt(
-                                            job_list, stage1_data_list
-                                        )
-                                    elif question_type == 'Vocabulary':
-                                        st.session_state.debug_logs.append("Using vocabulary candidate generation")
-                                        sys_msg_2, user_msg_2 = prompt_engineer.create_sequential_batch_stage2_vocabulary_prompt(
-                                            job_list, stage1_data_list
-                                        )
-                                    else:
+
+                                    # Grammar and vocabulary slices are independent, so a
+                                    # mixed batch issues both fused calls concurrently.
+                                    # Positions come from the masks computed before Stage 1.
+                                    # Rows whose stage-1 branch failed have no stem to
+                                    # validate; leave them out so their fan-out stays
+                                    # empty and final assembly skips them.
+                                    grammar_positions = [
+                                        p for p in unique_positions
+                                        if p < len(job_list) and p not in stage1_failed
+                                        and job_classes["is_grammar"][p]
+                                    ]
+                                    vocab_positions = [
+                                        p for p in unique_positions
+                                        if p < len(job_list) and p not in stage1_failed
+                                        and job_classes["is_vocab"][p]
+                                    ]
+
+                                    if not grammar_positions and not vocab_positions:
                                         st.error(f"Unknown question type: {question_type}")
                                         break
-                                    
-                                    raw_stage2 = llm_service.call_llm([sys_msg_2, user_msg_2], user_api_key)
-                                    
-                                    with st.expander("🔍 DEBUG: Stage 2 Raw Response", expanded=False):
-                                        st.text_area("Complete Raw LLM Response", raw_stage2, height=300, key="debug_stage2_raw")
-                                    
-                                    stage2_data, stage2_error = output_formatter.parse_response(raw_stage2)
-                                    if stage2_error:
-                                        st.error(f"Stage 2 failed: {stage2_error}")
-                                        break
-                                    
-                                    if isinstance(stage2_data, dict) and "candidates" in stage2_data:
-                                        stage2_data_list = stage2_data["candidates"]
-                                    else:
-                                        stage2_data_list, extract_error = output_formatter.extract_array_from_response(stage2_data)
-                                        if extract_error:
-                                            st.error(f"Stage 2 extraction failed: {extract_error}")
-                                            break
-                                    
-                                    st.session_state.debug_logs.append(f"Stage 2: Generated {len(stage2_data_list)} candidate sets")
-                                    
-                                    # ===== STAGE 3: VALIDATE AND FILTER =====
-                                    status_text.text(f"Stage 3: Validating candidates and selecting final distractors...")
-                                    st.session_state.debug_logs.append("\n--- STAGE 3: VALIDATION & FILTERING ---")
-                                    
-                                    if question_type == 'Grammar':
-                                        st.session_state.debug_logs.append("Using grammar validation")
-                                        sys_msg_3, user_msg_3 = prompt_engineer.create_sequential_batch_stage3_grammar_prompt(
-                                            job_list, stage1_data_list, stage2_data_list
+
+                                    # Each category is additionally sliced into
+                                    # decode-friendly chunks; all slices dispatch
+                                    # through one gather.
+                                    stage23_branches = []
+                                    for positions, builder, label in (
+                                        (grammar_positions,
+                                         prompt_engineer.create_sequential_batch_stage23_grammar_prompt,
+                                         "grammar"),
+                                        (vocab_positions,
+                                         prompt_engineer.create_sequential_batch_stage23_vocabulary_prompt,
+                                         "vocabulary"),
+                                    ):
+                                        if not positions:
+                                            continue
+                                        st.session_state.debug_logs.append(
+                                            f"Using fused {label} candidate generation + validation"
                                         )
-                                    elif question_type == 'Vocabulary':
-                                        st.session_state.debug_logs.append("Using vocabulary validation")
-                                        sys_msg_3, user_msg_3 = prompt_engineer.create_sequential_batch_stage3_vocabulary_prompt(
-                                            job_list, stage1_data_list, stage2_data_list
+                                        for s in range(0, len(positions), STAGE_CHUNK_SIZE):
+                                            chunk = positions[s:s + STAGE_CHUNK_SIZE]
+                                            stage23_branches.append((
+                                                chunk,
+                                                builder(
+                                                    [job_list[i] for i in chunk],
+                                                    [stage1_data_list[i] for i in chunk]
+                                                )
+                                            ))
+
+                                    raw_stage23_list = llm_service.call_llm_parallel(
+                                        [[sys_msg, user_msg] for _, (sys_msg, user_msg) in stage23_branches],
+                                        user_api_key,
+                                        response_schemas=[
+                                            prompt_engineer.stage23_response_schema(len(positions))
+                                            for positions, _ in stage23_branches
+                                        ],
+                                        on_progress=lambda done, total: status_text.text(
+                                            f"Stage 2+3: {done}/{total} sub-batches complete..."
                                         )
-                                    
-                                    raw_stage3 = llm_service.call_llm([sys_msg_3, user_msg_3], user_api_key)
-                                    
-                                    with st.expander("🔍 DEBUG: Stage 3 Raw Response", expanded=False):
-                                        st.text_area("Complete Raw LLM Response", raw_stage3, height=300, key="debug_stage3_raw")
-                                    
-                                    stage3_data, stage3_error = output_formatter.parse_response(raw_stage3)
-                                    if stage3_error:
-                                        st.error(f"Stage 3 failed: {stage3_error}")
+                                    )
+                                    raw_stage23 = "\n\n".join(raw_stage23_list)
+
+                                    if show_raw_responses:
+                                        with st.expander("🔍 DEBUG: Stage 2+3 Raw Response", expanded=False):
+                                            st.text_area("Complete Raw LLM Response", raw_stage23, height=300, key="debug_stage23_raw")
+
+                                    # Each fused entry carries both the candidate pool and
+                                    # the selections; split it back into the stage-2 and
+                                    # stage-3 views the debug viewers expect.
+                                    unique_index = {p: k for k, p in enumerate(unique_positions)}
+                                    stage2_unique = [{} for _ in unique_positions]
+                                    stage3_unique = [{} for _ in unique_positions]
+                                    failed_positions = set()
+                                    for branch_index, ((positions, (sys_msg, user_msg)), raw_branch) in enumerate(
+                                        zip(stage23_branches, raw_stage23_list)
+                                    ):
+                                        branch_data, branch_error = output_formatter.parse_response(raw_branch)
+                                        if branch_error:
+                                            # One repair attempt before giving the branch
+                                            # up: re-prompt pointing at the parse failure.
+                                            st.session_state.debug_logs.append(
+                                                f"Stage 2+3 branch parse failed ({branch_error}); retrying once"
+                                            )
+                                            repair_msg = (
+                                                user_msg
+                                                + "\n\nYour previous response was not valid JSON ("
+                                                + str(branch_error)
+                                                + "). Reply with valid JSON only."
+                                            )
+                                            raw_branch = llm_service.call_llm(
+                                                [sys_msg, repair_msg], user_api_key,
+                                                response_schema=prompt_engineer.stage23_response_schema(len(positions))
+                                            )
+                                            branch_data, branch_error = output_formatter.parse_response(raw_branch)
+
+                                        branch_list = None
+                                        if not branch_error:
+                                            if isinstance(branch_data, dict) and "validated" in branch_data:
+                                                branch_list = branch_data["validated"]
+                                            else:
+                                                branch_list, branch_error = output_formatter.extract_array_from_response(branch_data)
+
+                                        if branch_error:
+                                            # Keep the other branch's work: flag these
+                                            # jobs and assemble the rest of the batch.
+                                            st.warning(f"Stage 2+3 failed for {len(positions)} questions: {branch_error}")
+                                            failed_positions.update(positions)
+                                            continue
+
+                                        for pos, entry in zip(positions, branch_list):
+                                            k = unique_index[pos]
+                                            stage2_unique[k] = {
+                                                key: entry.get(key, "")
+                                                for key in ("Item Number", "Candidate A", "Candidate B",
+                                                            "Candidate C", "Candidate D", "Candidate E")
+                                            }
+                                            stage3_unique[k] = {
+                                                key: entry.get(key, "")
+                                                for key in ("Item Number", "Selected Distractor A",
+                                                            "Selected Distractor B", "Selected Distractor C",
+                                                            "Validation Notes")
+                                            }
+
+                                    if failed_positions and len(failed_positions) == len(unique_positions):
+                                        st.error("Stage 2+3 failed for every question in the batch.")
                                         break
-                                    
-                                    if isinstance(stage3_data, dict) and "validated" in stage3_data:
-                                        stage3_data_list = stage3_data["validated"]
-                                    else:
-                                        stage3_data_list, extract_error = output_formatter.extract_array_from_response(stage3_data)
-                                        if extract_error:
-                                            st.error(f"Stage 3 extraction failed: {extract_error}")
-                                            break
-                                    
-                                    st.session_state.debug_logs.append(f"Stage 3: Validated {len(stage3_data_list)} distractor sets")
+
+                                    # Fan results from representatives back out to their
+                                    # duplicate rows.
+                                    stage2_data_list = [
+                                        stage2_unique[u] if u < len(stage2_unique) else {}
+                                        for u in stage1_dup_map
+                                    ]
+                                    stage3_data_list = [
+                                        stage3_unique[u] if u < len(stage3_unique) else {}
+                                        for u in stage1_dup_map
+                                    ]
+
+                                    st.session_state.debug_logs.append(
+                                        f"Stage 2+3: Generated and validated {len(stage3_data_list)} distractor sets"
+                                    )
                                     
                                     # ===== FINAL ASSEMBLY =====
                                     st.session_state.debug_logs.append("\n--- FINAL ASSEMBLY ---")
@@ -565,26 +942,32 @@ with tab1:
                                         if i < len(stage3_data_list):
                                             stage1_data = stage1_data_list[i]
                                             stage3_data = stage3_data_list[i]
-                                            
+
+                                            if not stage3_data.get("Selected Distractor A"):
+                                                # Validation failed for this row's branch;
+                                                # ship the rest of the batch without it.
+                                                st.session_state.debug_logs.append(
+                                                    f"Skipped question {i+1}: no validated distractors"
+                                                )
+                                                continue
+
                                             complete_sentence = stage1_data.get("Complete Sentence", "")
                                             correct_answer = stage1_data.get("Correct Answer", "")
-                                            question_prompt = complete_sentence.replace(correct_answer, "____")
-                                            
-                                            options = [
-                                                stage3_data.get("Selected Distractor A", ""),
-                                                stage3_data.get("Selected Distractor B", ""),
-                                                stage3_data.get("Selected Distractor C", ""),
-                                                correct_answer
-                                            ]
-                                            
+                                            question_prompt = blank_out_answer(complete_sentence, correct_answer)
+
+                                            # Read each distractor once instead of re-fetching per field
+                                            distractor_a = stage3_data.get("Selected Distractor A", "")
+                                            distractor_b = stage3_data.get("Selected Distractor B", "")
+                                            distractor_c = stage3_data.get("Selected Distractor C", "")
+
                                             final_question = {
                                                 "Item Number": stage1_data.get("Item Number", ""),
                                                 "Assessment Focus": stage1_data.get("Assessment Focus", ""),
                                                 "Question Prompt": question_prompt,
                                                 "Answer A": correct_answer,
-                                                "Answer B": stage3_data.get("Selected Distractor A", ""),
-                                                "Answer C": stage3_data.get("Selected Distractor B", ""),
-                                                "Answer D": stage3_data.get("Selected Distractor C", ""),
+                                                "Answer B": distractor_a,
+                                                "Answer C": distractor_b,
+                                                "Answer D": distractor_c,
                                                 "Correct Answer": "A",
                                                 "CEFR rating": stage1_data.get("CEFR rating", ""),
                                                 "Category": stage1_data.get("Category", "")
@@ -592,37 +975,165 @@ with tab1:
                                             generated_questions.append(final_question)
                                             st.session_state.debug_logs.append(f"Assembled question {i+1}")
                                     
+                                    # Restore the plan's original job order for display.
+                                    generated_questions.sort(
+                                        key=lambda q: original_order.get(str(q.get("Item Number")), len(original_order))
+                                    )
+
                                     st.session_state.debug_logs.append(f"\nTOTAL ASSEMBLED: {len(generated_questions)}")
                                     break
                                 
                             elif job['strategy'] == "Segmented (2-Call)":
-                                sys_msg_1, user_msg_1 = prompt_engineer.create_options_prompt(job, example_banks)
-                                raw_options = llm_service.call_llm([sys_msg_1, user_msg_1], user_api_key)
-                                options_data, options_error = output_formatter.parse_response(raw_options)
-                                
-                                if options_error:
-                                    st.error(f"Job {job['job_id']} Failed at Options: {options_error}")
-                                    continue
-                                
-                                options_json_string = json.dumps(options_data)
-                                sys_msg_2, user_msg_2 = prompt_engineer.create_stem_prompt(job, options_json_string)
-                                raw_response = llm_service.call_llm([sys_msg_2, user_msg_2], user_api_key)
-                                question_data, error = output_formatter.parse_response(raw_response)
-                                
-                                if error:
-                                    st.error(f"Job {job['job_id']} Failed: {error}")
-                                else:
-                                    generated_questions.append(question_data)
-                                    
+                                # BATCHED SEGMENTED MODE: one options call plus one stem
+                                # call for the whole batch instead of two calls per job.
+                                if index == 0:
+                                    status_text.text("Segmented: Generating answer options...")
+                                    sys_msg_1, user_msg_1 = prompt_engineer.create_options_batch_prompt(job_list, example_banks)
+                                    raw_options = llm_service.call_llm(
+                                        [sys_msg_1, user_msg_1], user_api_key,
+                                        response_schema=prompt_engineer.options_batch_response_schema(len(job_list))
+                                    )
+                                    options_data, options_error = output_formatter.parse_response(raw_options)
+
+                                    if options_error:
+                                        st.error(f"Segmented batch failed at Options: {options_error}")
+                                        break
+
+                                    options_list, extract_error = output_formatter.extract_array_from_response(options_data)
+                                    if extract_error:
+                                        st.error(f"Segmented options extraction failed: {extract_error}")
+                                        break
+
+                                    status_text.text("Segmented: Writing question stems...")
+                                    sys_msg_2, user_msg_2 = prompt_engineer.create_stem_batch_prompt(job_list, options_list)
+                                    raw_response = llm_service.call_llm(
+                                        [sys_msg_2, user_msg_2], user_api_key,
+                                        response_schema=prompt_engineer.stem_batch_response_schema(len(job_list))
+                                    )
+                                    stems_data, error = output_formatter.parse_response(raw_response)
+
+                                    if error:
+                                        st.error(f"Segmented batch failed at Stems: {error}")
+                                        break
+
+                                    question_list, extract_error = output_formatter.extract_array_from_response(stems_data)
+                                    if extract_error:
+                                        st.error(f"Segmented stems extraction failed: {extract_error}")
+                                        break
+
+                                    generated_questions.extend(question_list)
+                                    break
+
                             else:  # Holistic
-                                sys_msg, user_msg = prompt_engineer.create_holistic_prompt(job, example_banks)
-                                raw_response = llm_service.call_llm([sys_msg, user_msg], user_api_key)
-                                question_data, error = output_formatter.parse_response(raw_response)
-                                
-                                if error:
-                                    st.error(f"Job {job['job_id']} Failed: {error}")
-                                else:
-                                    generated_questions.append(question_data)
+                                # BATCHED HOLISTIC MODE: each job is an independent
+                                # single-call prompt, so fire the whole batch through the
+                                # bounded asyncio fan-out instead of paying one round-trip
+                                # of latency per job.
+                                if index == 0:
+                                    # Jobs sharing (cefr, type, focus, topic) produce
+                                    # byte-identical prompts — the normal case when the
+                                    # user picks one focus and types a topic — so collapse
+                                    # them to one request per unique spec and ask it for
+                                    # one sampled completion per duplicate job (n=group
+                                    # size). Same round-trip savings, but every job still
+                                    # gets its own temperature-0.9 draw instead of a copy
+                                    # of one question.
+                                    unique_positions = []
+                                    job_to_unique = []
+                                    seen_specs = {}
+                                    for pos, j in enumerate(job_list):
+                                        spec = (j['cefr'], j['type'], j['focus'], j.get('context', 'General'))
+                                        uniq = seen_specs.get(spec)
+                                        if uniq is None:
+                                            uniq = seen_specs[spec] = len(unique_positions)
+                                            unique_positions.append(pos)
+                                        job_to_unique.append(uniq)
+                                    group_sizes = [0] * len(unique_positions)
+                                    for uniq in job_to_unique:
+                                        group_sizes[uniq] += 1
+
+                                    holistic_prompts = [
+                                        prompt_engineer.create_holistic_prompt(job_list[pos], example_banks)
+                                        for pos in unique_positions
+                                    ]
+
+                                    if use_batch_api:
+                                        # Cost-optimized path: hand the jobs to the Batch
+                                        # API and pick the results up later. Submitted
+                                        # per job (not per unique spec) because retrieval
+                                        # happens on a later rerun, after the dedupe map
+                                        # is gone.
+                                        status_text.text("Holistic: Submitting jobs to the Batch API...")
+                                        all_prompts = [
+                                            prompt_engineer.create_holistic_prompt(j, example_banks)
+                                            for j in job_list
+                                        ]
+                                        batch_id = llm_service.batch_submit(
+                                            [[sys_msg, user_msg] for sys_msg, user_msg in all_prompts],
+                                            user_api_key,
+                                            custom_ids=[j['job_id'] for j in job_list]
+                                        )
+                                        if batch_id.startswith("Error:"):
+                                            st.error(f"Batch submission failed: {batch_id}")
+                                        else:
+                                            st.session_state.holistic_batch_id = batch_id
+                                            st.info(f"Batch {batch_id} submitted. Retrieve the results below once it completes.")
+                                        break
+
+                                    if len(job_list) == 1:
+                                        # Single job: stream the response into a live
+                                        # preview so first content appears immediately
+                                        # instead of after the full generation.
+                                        status_text.text("Holistic: Generating 1 question (streaming)...")
+                                        preview = st.empty()
+                                        stream_buf = []
+
+                                        def _on_holistic_delta(chunk):
+                                            stream_buf.append(chunk)
+                                            preview.code("".join(stream_buf), language="json")
+
+                                        raw_responses = [llm_service.call_llm_stream(
+                                            list(holistic_prompts[0]),
+                                            user_api_key,
+                                            on_delta=_on_holistic_delta
+                                        )]
+                                        preview.empty()
+                                    else:
+                                        status_text.text(
+                                            f"Holistic: Generating {len(job_list)} questions across "
+                                            f"{len(holistic_prompts)} parallel requests..."
+                                        )
+                                        raw_responses = llm_service.call_llm_parallel(
+                                            [[sys_msg, user_msg] for sys_msg, user_msg in holistic_prompts],
+                                            user_api_key,
+                                            n_choices=group_sizes,
+                                            on_progress=lambda done, total: (
+                                                status_text.text(f"Holistic: {done}/{total} requests complete..."),
+                                                progress_bar.progress(done / total)
+                                            )
+                                        )
+                                    # Each entry holds one completion per duplicate job of
+                                    # its spec; errors come back as a single string, which
+                                    # then reports per job below.
+                                    unique_parsed = [
+                                        [
+                                            output_formatter.parse_response(raw)
+                                            for raw in (raws if isinstance(raws, list) else [raws])
+                                        ]
+                                        for raws in raw_responses
+                                    ]
+                                    next_choice = [0] * len(unique_positions)
+                                    for j, uniq in zip(job_list, job_to_unique):
+                                        choices = unique_parsed[uniq]
+                                        question_data, error = choices[min(next_choice[uniq], len(choices) - 1)]
+                                        next_choice[uniq] += 1
+                                        if error:
+                                            st.error(f"Job {j['job_id']} Failed: {error}")
+                                        else:
+                                            question_data = dict(question_data)
+                                            question_data["Item Number"] = j['job_id']
+                                            generated_questions.append(question_data)
+                                    break
 
                             progress_bar.progress((index + 1) / len(job_list))
                         
@@ -632,18 +1143,20 @@ with tab1:
                         if generated_questions:
                             st.success(f"Successfully generated {len(generated_questions)} questions!")
                             
-                            final_df = pd.DataFrame(generated_questions)
+                            final_df = questions_frame(generated_questions)
                             st.dataframe(final_df)
                             
                             st.session_state.last_batch = final_df
                             st.session_state.last_batch_strategy = strategy
                             
                             if strategy == "Sequential Batch (3-Call)":
-                                st.session_state.sequential_stage1_data = pd.DataFrame(stage1_data_list) if stage1_data_list else None
-                                st.session_state.sequential_stage2_data = pd.DataFrame(stage2_data_list) if stage2_data_list else None
-                                st.session_state.sequential_stage3_data = pd.DataFrame(stage3_data_list) if stage3_data_list else None
+                                # Stored as raw row lists; the Refinement Workshop
+                                # materializes DataFrames only when it renders them.
+                                st.session_state.sequential_stage1_data = stage1_data_list or None
+                                st.session_state.sequential_stage2_data = stage2_data_list or None
+                                st.session_state.sequential_stage3_data = stage3_data_list or None
                             
-                            csv = final_df.to_csv(index=False).encode('utf-8')
+                            csv = df_to_csv_bytes(final_df)
                             st.download_button(
                                 label="📥 Download Questions as CSV",
                                 data=csv,
@@ -660,6 +1173,40 @@ with tab1:
                         st.error(str(e))
                         st.code(traceback.format_exc())
 
+    if st.session_state.get("holistic_batch_id"):
+        st.divider()
+        st.subheader("Batch API Job")
+        st.caption(f"Submitted batch: {st.session_state.holistic_batch_id}")
+        if st.button("Retrieve Batch Results"):
+            import llm_service
+            import output_formatter
+
+            status, results = llm_service.batch_retrieve(st.session_state.holistic_batch_id, user_api_key)
+            if results is None:
+                st.info(f"Batch status: {status}")
+            else:
+                batch_questions = []
+                for custom_id, raw_response in results.items():
+                    question_data, error = output_formatter.parse_response(raw_response)
+                    if error:
+                        st.error(f"Job {custom_id} Failed: {error}")
+                    else:
+                        batch_questions.append(question_data)
+
+                if batch_questions:
+                    st.success(f"Retrieved {len(batch_questions)} questions from the batch.")
+                    batch_df = pd.DataFrame(batch_questions)
+                    st.dataframe(batch_df)
+                    st.session_state.last_batch = batch_df
+                    st.session_state.last_batch_strategy = "Holistic (1-Call)"
+                    st.download_button(
+                        label="📥 Download Batch Questions as CSV",
+                        data=df_to_csv_bytes(batch_df),
+                        file_name="generated_test_batch_api.csv",
+                        mime="text/csv",
+                        key="download_batch_api_csv"
+                    )
+
 
 # =============================
 # TAB 2: REFINEMENT WORKSHOP
@@ -706,72 +1253,42 @@ with tab2:
             st.subheader("📊 Three-Stage Pipeline View")
             st.caption("Review outputs from each stage of the new architecture")
             
-            st.markdown("### Stage 1: Sentence Generation")
-            if st.session_state.sequential_stage1_data is not None:
-                st.data_editor(
-                    st.session_state.sequential_stage1_data,
-                    use_container_width=True,
-                    num_rows="dynamic",
-                    key="stage1_editor"
-                )
-            
+            render_stage_editor(
+                "### Stage 1: Sentence Generation",
+                st.session_state.sequential_stage1_data,
+                "stage1_editor"
+            )
             st.divider()
-            
-            st.markdown("### Stage 2: Candidate Generation (5 per question)")
-            if st.session_state.sequential_stage2_data is not None:
-                st.data_editor(
-                    st.session_state.sequential_stage2_data,
-                    use_container_width=True,
-                    num_rows="dynamic",
-                    key="stage2_editor"
-                )
-            
+            render_stage_editor(
+                "### Stage 2: Candidate Generation (5 per question)",
+                st.session_state.sequential_stage2_data,
+                "stage2_editor"
+            )
             st.divider()
-            
-            st.markdown("### Stage 3: Validation & Selection (Final 3 per question)")
-            if st.session_state.sequential_stage3_data is not None:
-                st.data_editor(
-                    st.session_state.sequential_stage3_data,
-                    use_container_width=True,
-                    num_rows="dynamic",
-                    key="stage3_editor"
-                )
-            
+            render_stage_editor(
+                "### Stage 3: Validation & Selection (Final 3 per question)",
+                st.session_state.sequential_stage3_data,
+                "stage3_editor"
+            )
             st.divider()
             
             st.markdown("### Final Generated Questions")
-            edited_final = st.data_editor(
+            render_batch_editor(
                 working_batch,
-                use_container_width=True,
-                num_rows="dynamic",
-                key="final_editor"
-            )
-            
-            csv_final = edited_final.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="📥 Download Final Questions",
-                data=csv_final,
-                file_name="final_questions.csv",
-                mime="text/csv",
-                key="download_final"
+                "final_editor",
+                "📥 Download Final Questions",
+                "final_questions.csv",
+                "download_final"
             )
         
         else:
             st.subheader("📝 Simple Edit Mode")
-            edited_batch = st.data_editor(
+            render_batch_editor(
                 working_batch,
-                use_container_width=True,
-                num_rows="dynamic",
-                key="simple_editor"
-            )
-            
-            csv = edited_batch.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="📥 Download Edited Batch",
-                data=csv,
-                file_name="edited_questions.csv",
-                mime="text/csv",
-                key="download_edited"
+                "simple_editor",
+                "📥 Download Edited Batch",
+                "edited_questions.csv",
+                "download_edited"
             )
 
 # =============================
@@ -781,23 +1298,27 @@ with tab3:
     st.header("🐛 Debug Logs")
     st.caption("Complete execution trace for troubleshooting")
     
-    if st.session_state.debug_logs:
-        debug_text = "\n".join(st.session_state.debug_logs)
-        st.text_area("Execution Log", debug_text, height=600, key="debug_log_display")
-        
-        log_data = debug_text.encode('utf-8')
-        st.download_button(
-            label="📥 Download Debug Logs",
-            data=log_data,
-            file_name=f"debug_log_{time.strftime('%Y%m%d_%H%M%S')}.txt",
-            mime="text/plain",
-        )
-    else:
-        st.info("No debug logs available. Generate a batch to see execution details.")
-    
-    if st.button("Clear Debug Logs"):
-        st.session_state.debug_logs = []
-        st.rerun()
+    @st.fragment
+    def render_debug_logs():
+        if st.session_state.debug_logs:
+            debug_text = st.session_state.debug_logs.text()
+            st.text_area("Execution Log", debug_text, height=600, key="debug_log_display")
+
+            log_data = debug_text.encode('utf-8')
+            st.download_button(
+                label="📥 Download Debug Logs",
+                data=log_data,
+                file_name=f"debug_log_{time.strftime('%Y%m%d_%H%M%S')}.txt",
+                mime="text/plain",
+            )
+        else:
+            st.info("No debug logs available. Generate a batch to see execution details.")
+
+        if st.button("Clear Debug Logs"):
+            st.session_state.debug_logs.clear()
+            st.rerun()
+
+    render_debug_logs()
 # =============================
 # TAB 4: VOCABULARY LIST GENERATOR (UPDATED WITH COLUMN VALIDATION)
 # =============================
@@ -888,6 +1409,12 @@ with tab4:
                 help="Include vocabulary definitions to guide question generation. Recommended for specialized or technical vocabulary.",
                 key="use_definitions"
             )
+
+            bypass_response_cache = st.checkbox(
+                "Bypass response cache",
+                help="Force a fresh Stage 1 LLM call even when an identical prompt has a stored response; the fresh response replaces the cached one.",
+                key="bypass_response_cache"
+            )
         
         with col2:
             batch_selection_mode = st.radio(
@@ -923,6 +1450,11 @@ with tab4:
         
         # Generate button
         if st.button("Generate Questions from Vocabulary List", type="primary", use_container_width=True):
+            import llm_service
+            import output_formatter
+            import prompt_engineer
+            import response_cache
+
             # Select vocabulary items based on batch mode
             selected_vocab = None
             
@@ -981,7 +1513,7 @@ with tab4:
                             st.error("No valid vocabulary items to process after validation.")
                             st.stop()
                         
-                        st.session_state.debug_logs = []
+                        st.session_state.debug_logs.clear()
                         st.session_state.debug_logs.append("="*80)
                         st.session_state.debug_logs.append("VOCABULARY LIST GENERATION - STARTING")
                         st.session_state.debug_logs.append(f"Vocabulary items: {len(vocab_job_list)}")
@@ -1005,77 +1537,132 @@ with tab4:
                             create_vocab_list_stage3_prompt
                         )
                         
-                        # ===== STAGE 1: GENERATE SENTENCES =====
-                        status_text = st.empty()
-                        status_text.text("Stage 1: Generating sentences with target vocabulary...")
-                        st.session_state.debug_logs.append("\n--- STAGE 1: SENTENCE GENERATION ---")
-                        
-                        sys_msg_1, user_msg_1 = create_vocab_list_stage1_prompt(vocab_job_list, question_form)
-                        raw_stage1 = llm_service.call_llm([sys_msg_1, user_msg_1], user_api_key)
-                        
-                        stage1_data, stage1_error = output_formatter.parse_response(raw_stage1)
-                        if stage1_error:
-                            st.error(f"Stage 1 failed: {stage1_error}")
-                            st.stop()
-                        
-                        if isinstance(stage1_data, dict) and "questions" in stage1_data:
-                            stage1_data_list = stage1_data["questions"]
-                        else:
-                            stage1_data_list, extract_error = output_formatter.extract_array_from_response(stage1_data)
-                            if extract_error:
-                                st.error(f"Stage 1 extraction failed: {extract_error}")
-                                st.stop()
-                        
-                        st.session_state.debug_logs.append(f"Stage 1: Generated {len(stage1_data_list)} sentences")
-                        
-                        # ===== STAGE 2: GENERATE CANDIDATES =====
-                        status_text.text("Stage 2: Generating candidate distractors (hybrid sourcing)...")
-                        st.session_state.debug_logs.append("\n--- STAGE 2: HYBRID DISTRACTOR GENERATION ---")
-                        st.session_state.debug_logs.append(f"Vocabulary pool size: {len(vocab_df)} items")
-                        
-                        sys_msg_2, user_msg_2 = create_vocab_list_stage2_prompt(
-                            vocab_job_list, stage1_data_list, vocab_df
+                        # ===== TOKEN-BOUNDED BATCHING =====
+                        # A single oversized batch risks context overflow and a failed,
+                        # re-billed call; pack jobs so each prompt stays under budget.
+                        vocab_batches = prompt_engineer.split_into_token_bounded_batches(
+                            vocab_job_list,
+                            lambda jobs: create_vocab_list_stage1_prompt(jobs, question_form)
                         )
-                        raw_stage2 = llm_service.call_llm([sys_msg_2, user_msg_2], user_api_key)
+                        if len(vocab_batches) > 1:
+                            st.session_state.debug_logs.append(
+                                f"Token budget: split {len(vocab_job_list)} jobs into {len(vocab_batches)} batches"
+                            )
                         
-                        stage2_data, stage2_error = output_formatter.parse_response(raw_stage2)
-                        if stage2_error:
-                            st.error(f"Stage 2 failed: {stage2_error}")
-                            st.stop()
+                        status_text = st.empty()
+                        stage1_data_list = []
+                        stage2_data_list = []
+                        stage3_data_list = []
                         
-                        if isinstance(stage2_data, dict) and "candidates" in stage2_data:
-                            stage2_data_list = stage2_data["candidates"]
-                        else:
-                            stage2_data_list, extract_error = output_formatter.extract_array_from_response(stage2_data)
-                            if extract_error:
-                                st.error(f"Stage 2 extraction failed: {extract_error}")
+                        for batch_no, batch_jobs in enumerate(vocab_batches):
+                            batch_label = f" (batch {batch_no + 1}/{len(vocab_batches)})" if len(vocab_batches) > 1 else ""
+                            
+                            # ===== STAGE 1: GENERATE SENTENCES =====
+                            status_text.text(f"Stage 1: Generating sentences with target vocabulary...{batch_label}")
+                            st.session_state.debug_logs.append(f"\n--- STAGE 1: SENTENCE GENERATION{batch_label} ---")
+                            
+                            sys_msg_1, user_msg_1 = create_vocab_list_stage1_prompt(batch_jobs, question_form)
+                            
+                            # Re-running the same vocabulary list with the same settings
+                            # produces an identical prompt, so serve stage 1 from the
+                            # on-disk response cache when possible.
+                            stage1_cache_key = response_cache.make_key(
+                                [sys_msg_1, user_msg_1], llm_service.DEFAULT_MODEL,
+                                seed=prompt_engineer.RANDOM_SEED
+                            )
+                            raw_stage1 = None if bypass_response_cache else response_cache.get(stage1_cache_key)
+                            if raw_stage1 is not None:
+                                st.session_state.debug_logs.append("Stage 1: served from response cache")
+                            else:
+                                # Stream the response so the status line tracks questions
+                                # as their objects complete in the arriving JSON.
+                                vocab_stage1_progress = output_formatter.JSONArrayProgress()
+                            
+                                def on_vocab_stage1_delta(delta):
+                                    done = vocab_stage1_progress.feed(delta)
+                                    if done:
+                                        status_text.text(f"Stage 1: Generated {min(done, len(batch_jobs))} of {len(batch_jobs)} sentences...{batch_label}")
+                            
+                                raw_stage1 = llm_service.call_llm_stream(
+                                    [sys_msg_1, user_msg_1], user_api_key,
+                                    response_schema=prompt_engineer.vocab_stage1_response_schema(len(batch_jobs)),
+                                    on_delta=on_vocab_stage1_delta
+                                )
+                                response_cache.set(stage1_cache_key, raw_stage1)
+                            
+                            stage1_data, stage1_error = output_formatter.parse_response(raw_stage1)
+                            if stage1_error:
+                                st.error(f"Stage 1 failed: {stage1_error}")
                                 st.stop()
-                        
-                        st.session_state.debug_logs.append(f"Stage 2: Generated {len(stage2_data_list)} candidate sets")
-                        
-                        # ===== STAGE 3: VALIDATE AND FILTER =====
-                        status_text.text("Stage 3: Validating and selecting final distractors...")
-                        st.session_state.debug_logs.append("\n--- STAGE 3: VALIDATION & FILTERING ---")
-                        
-                        sys_msg_3, user_msg_3 = create_vocab_list_stage3_prompt(
-                            vocab_job_list, stage1_data_list, stage2_data_list
-                        )
-                        raw_stage3 = llm_service.call_llm([sys_msg_3, user_msg_3], user_api_key)
-                        
-                        stage3_data, stage3_error = output_formatter.parse_response(raw_stage3)
-                        if stage3_error:
-                            st.error(f"Stage 3 failed: {stage3_error}")
-                            st.stop()
-                        
-                        if isinstance(stage3_data, dict) and "validated" in stage3_data:
-                            stage3_data_list = stage3_data["validated"]
-                        else:
-                            stage3_data_list, extract_error = output_formatter.extract_array_from_response(stage3_data)
-                            if extract_error:
-                                st.error(f"Stage 3 extraction failed: {extract_error}")
+                            
+                            if isinstance(stage1_data, dict) and "questions" in stage1_data:
+                                stage1_batch = stage1_data["questions"]
+                            else:
+                                stage1_batch, extract_error = output_formatter.extract_array_from_response(stage1_data)
+                                if extract_error:
+                                    st.error(f"Stage 1 extraction failed: {extract_error}")
+                                    st.stop()
+                            
+                            st.session_state.debug_logs.append(f"Stage 1: Generated {len(stage1_batch)} sentences")
+                            
+                            # ===== STAGE 2: GENERATE CANDIDATES =====
+                            status_text.text(f"Stage 2: Generating candidate distractors (hybrid sourcing)...{batch_label}")
+                            st.session_state.debug_logs.append(f"\n--- STAGE 2: HYBRID DISTRACTOR GENERATION{batch_label} ---")
+                            st.session_state.debug_logs.append(f"Vocabulary pool size: {len(vocab_df)} items")
+                            
+                            sys_msg_2, user_msg_2 = create_vocab_list_stage2_prompt(
+                                batch_jobs, stage1_batch, vocab_df
+                            )
+                            raw_stage2 = llm_service.call_llm(
+                                [sys_msg_2, user_msg_2], user_api_key,
+                                response_schema=prompt_engineer.vocab_stage2_response_schema(len(batch_jobs))
+                            )
+                            
+                            stage2_data, stage2_error = output_formatter.parse_response(raw_stage2)
+                            if stage2_error:
+                                st.error(f"Stage 2 failed: {stage2_error}")
                                 st.stop()
-                        
-                        st.session_state.debug_logs.append(f"Stage 3: Validated {len(stage3_data_list)} distractor sets")
+                            
+                            if isinstance(stage2_data, dict) and "candidates" in stage2_data:
+                                stage2_batch = stage2_data["candidates"]
+                            else:
+                                stage2_batch, extract_error = output_formatter.extract_array_from_response(stage2_data)
+                                if extract_error:
+                                    st.error(f"Stage 2 extraction failed: {extract_error}")
+                                    st.stop()
+                            
+                            st.session_state.debug_logs.append(f"Stage 2: Generated {len(stage2_batch)} candidate sets")
+                            
+                            # ===== STAGE 3: VALIDATE AND FILTER =====
+                            status_text.text(f"Stage 3: Validating and selecting final distractors...{batch_label}")
+                            st.session_state.debug_logs.append(f"\n--- STAGE 3: VALIDATION & FILTERING{batch_label} ---")
+                            
+                            sys_msg_3, user_msg_3 = create_vocab_list_stage3_prompt(
+                                batch_jobs, stage1_batch, stage2_batch
+                            )
+                            raw_stage3 = llm_service.call_llm(
+                                [sys_msg_3, user_msg_3], user_api_key,
+                                response_schema=prompt_engineer.vocab_stage3_response_schema(len(batch_jobs))
+                            )
+                            
+                            stage3_data, stage3_error = output_formatter.parse_response(raw_stage3)
+                            if stage3_error:
+                                st.error(f"Stage 3 failed: {stage3_error}")
+                                st.stop()
+                            
+                            if isinstance(stage3_data, dict) and "validated" in stage3_data:
+                                stage3_batch = stage3_data["validated"]
+                            else:
+                                stage3_batch, extract_error = output_formatter.extract_array_from_response(stage3_data)
+                                if extract_error:
+                                    st.error(f"Stage 3 extraction failed: {extract_error}")
+                                    st.stop()
+                            
+                            st.session_state.debug_logs.append(f"Stage 3: Validated {len(stage3_batch)} distractor sets")
+                            
+                            stage1_data_list.extend(stage1_batch)
+                            stage2_data_list.extend(stage2_batch)
+                            stage3_data_list.extend(stage3_batch)
                         
                         # ===== FINAL ASSEMBLY =====
                         st.session_state.debug_logs.append("\n--- FINAL ASSEMBLY ---")
@@ -1089,23 +1676,20 @@ with tab4:
                                 
                                 complete_sentence = stage1_data.get("Complete Sentence", "")
                                 correct_answer = stage1_data.get("Correct Answer", "")
-                                question_prompt = complete_sentence.replace(correct_answer, "____")
-                                
-                                options = [
-                                    stage3_data.get("Selected Distractor A", ""),
-                                    stage3_data.get("Selected Distractor B", ""),
-                                    stage3_data.get("Selected Distractor C", ""),
-                                    correct_answer
-                                ]
-                                
+                                question_prompt = blank_out_answer(complete_sentence, correct_answer)
+
+                                # Stage 3 uses the compact schema: three picks per item
+                                picks = stage3_data.get("picks", [])
+                                picks = list(picks[:3]) + [""] * (3 - len(picks[:3]))
+
                                 vocab_question = {
                                     "ConceptID": vocab_row.get('ConceptID', ''),
                                     "Base Vocabulary Item": vocab_row.get('Base Vocabulary Item', ''),
                                     "Question Prompt": question_prompt,
                                     "Answer A": correct_answer,
-                                    "Answer B": stage3_data.get("Selected Distractor A", ""),
-                                    "Answer C": stage3_data.get("Selected Distractor B", ""),
-                                    "Answer D": stage3_data.get("Selected Distractor C", ""),
+                                    "Answer B": picks[0],
+                                    "Answer C": picks[1],
+                                    "Answer D": picks[2],
                                     "Correct Answer": "A"
                                 }
                                 vocab_questions.append(vocab_question)
@@ -1128,7 +1712,7 @@ with tab4:
                             st.dataframe(vocab_questions_df, use_container_width=True)
                             
                             # Download button
-                            csv_output = vocab_questions_df.to_csv(index=False).encode('utf-8')
+                            csv_output = df_to_csv_bytes(vocab_questions_df)
                             st.download_button(
                                 label="📥 Download Vocabulary Questions CSV",
                                 data=csv_output,
@@ -1,4 +1,5 @@
 import random
+import sys
 
 def create_job_list(
     total_questions, 
@@ -16,42 +17,38 @@ def create_job_list(
     batch processing model's cross-question awareness. Style micro-contexts 
     have been removed to prevent contamination of Assessment Focus labels.
     """
-    job_list = []
-    
     # Topic Variance (Semantic Domains) - prevents thematic repetition
     random_domains = [
-        "Health & Fitness", "Technology & Computers", "Cooking & Food", 
-        "Money & Shopping", "Daily Routine", "Art & Music", 
-        "Weather & Nature", "Work & Jobs", "Education & Learning", 
+        "Health & Fitness", "Technology & Computers", "Cooking & Food",
+        "Money & Shopping", "Daily Routine", "Art & Music",
+        "Weather & Nature", "Work & Jobs", "Education & Learning",
         "Transport & Cities", "Family & Relationships", "Current Events"
     ]
-    
-    # Check if user provided a specific topic
-    user_provided_topic = True
-    if not context_topic or context_topic.strip() == "":
-        user_provided_topic = False
-    
-    for i in range(total_questions):
-        current_focus = random.choice(selected_focus_list)
-        job_id = f"{q_type[0].upper()}{cefr_target}-{i+1}"
-        
-        if user_provided_topic:
-            # Use user-specified topic for all questions in batch
-            main_topic = context_topic
-        else:
-            # Cycle through random domains to ensure topic diversity
-            current_domain = random_domains[i % len(random_domains)]
-            main_topic = current_domain
-        
-        job = {
-            "job_id": job_id,
+
+    # Everything but the focus draw, the topic rotation and the numbered
+    # job_id is invariant across the batch, so compute it once. The strings
+    # are interned so the per-job copies of these low-cardinality values
+    # share one object downstream.
+    q_type = sys.intern(q_type)
+    cefr_target = sys.intern(cefr_target)
+    job_id_prefix = f"{q_type[0].upper()}{cefr_target}-"
+    focuses = [sys.intern(f) for f in random.choices(selected_focus_list, k=total_questions)]
+
+    if context_topic and context_topic.strip():
+        # Use user-specified topic for all questions in batch
+        topics = [context_topic] * total_questions
+    else:
+        # Cycle through random domains to ensure topic diversity
+        topics = [random_domains[i % len(random_domains)] for i in range(total_questions)]
+
+    return [
+        {
+            "job_id": f"{job_id_prefix}{i + 1}",
             "type": q_type,
             "cefr": cefr_target,
-            "focus": current_focus,
-            "context": main_topic,
+            "focus": focuses[i],
+            "context": topics[i],
             "strategy": generation_strategy
         }
-        
-        job_list.append(job)
-        
-    return job_list
+        for i in range(total_questions)
+    ]